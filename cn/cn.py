@@ -70,7 +70,7 @@ def main():
 		print u, v, p
 
 
-def link_pred(G, seeds, fname):
+def link_pred(G, seeds, fname, store=None):
 	print str(fname) + '.txt'
 	expansion = []
 	for node in G.node:
@@ -109,27 +109,36 @@ def link_pred(G, seeds, fname):
 		node.add(u)
 		node.add(v)
 
-	#nx.write_edgelist(subgraph, "result/origingraph/{0}.edgelist".format(fname))
-	origing_graph = open("result/origingraph/{0}.edgelist".format(fname), 'w')
-	for u, v in subgraph.edges():
-		origing_graph.write("{0}\t{1}\n".format(u, v))
-	origing_graph.close()
-
-	node_file = open('result/node/{0}.txt'.format(fname), 'w')
-	for item in node:
-		node_file.write('{0}\n'.format(item))
-	node_file.close()
-
-	edge_file = open('result/expanedge/{0}.txt'.format(fname), 'w')
-	for u, v in expansion:
-		edge_file.write('{0}\t{1}\n'.format(u, v))
-	edge_file.close()
+	if store is not None:
+		store.put_edges(fname, 'origingraph', subgraph.edges())
+		store.put_nodes(fname, 'node', node)
+		store.put_edges(fname, 'expanedge', expansion)
+	else:
+		#nx.write_edgelist(subgraph, "result/origingraph/{0}.edgelist".format(fname))
+		origing_graph = open("result/origingraph/{0}.edgelist".format(fname), 'w')
+		for u, v in subgraph.edges():
+			origing_graph.write("{0}\t{1}\n".format(u, v))
+		origing_graph.close()
+
+		node_file = open('result/node/{0}.txt'.format(fname), 'w')
+		for item in node:
+			node_file.write('{0}\n'.format(item))
+		node_file.close()
+
+		edge_file = open('result/expanedge/{0}.txt'.format(fname), 'w')
+		for u, v in expansion:
+			edge_file.write('{0}\t{1}\n'.format(u, v))
+		edge_file.close()
 	
 	print len(node)
 
 if __name__ == '__main__':
 	G=read_edgelist('../testdata/humanNet.net')
 
+	pathways = read_terminal_corpus('../pathway', packed='../pathway.npz')
+	store = ResultStore('result/cn.db')
 	for i in range(1, 299):
-		seed =read_terminals('../pathway/{0}.txt'.format(i))
-		link_pred(G, seed, str(i))
\ No newline at end of file
+		seed = pathways[str(i)]
+		link_pred(G, seed, str(i), store)
+	#store.export('result', ext={'origingraph': '.edgelist'})    #the per-file layout
+	store.close()
\ No newline at end of file
@@ -0,0 +1,43 @@
+'''
+Benchmark of the array backends of kWalk.
+Usage: python bench_backend.py [nodes ...]
+A scale-free network is built for each size (default 200 500 1000), and
+kWalk and limkWalks are timed with 20 seeds on every backend. The backend
+that 'auto' picks is marked with *.
+'''
+import sys
+import time
+import random
+import networkx as nx
+from kWalk import *
+
+
+def bench(f,repeat=3):
+    best=None
+    for i in range(repeat):
+        t1=time.time()
+        g=f()
+        t2=time.time()
+        if best is None or t2-t1 < best:
+            best=t2-t1
+    return best,g.graph['backend']
+
+
+def main():
+    sizes=[200,500,1000]
+    if len(sys.argv) > 1:
+        sizes=[int(x) for x in sys.argv[1:]]
+    random.seed(0)
+    for n in sizes:
+        G=nx.barabasi_albert_graph(n,3,seed=n)
+        K=random.sample(G.nodes(),20)
+        auto=select_backend(transition_matrix(G)[2])
+        for backend in BACKENDS[1:]:
+            tk,used=bench(lambda: kWalk(K,G,backend=backend))
+            tl,used=bench(lambda: limkWalks(K,G,L=10,backend=backend))
+            mark='*' if backend==auto else ''
+            print '%d nodes\t%s%s\t(ran %s)\tkWalk %.3fs\tlimkWalks %.3fs'%(n,backend,mark,used,tk,tl)
+
+
+if __name__=='__main__':
+    main()
@@ -0,0 +1,59 @@
+'''
+Benchmark of compressed network input for gr_io.
+Usage: python bench_gr_io.py network_file [repeat]
+The network file is copied uncompressed and gzip/bz2 compressed to a temporary
+directory, and read_edgelist() is timed on each copy.
+'''
+import os
+import sys
+import time
+import shutil
+import tempfile
+import gzip
+import bz2
+from gr_io import *
+
+
+def bench_read(path,repeat=3):
+    best=None
+    for i in range(repeat):
+        t1=time.time()
+        G=read_edgelist(path)
+        t2=time.time()
+        if best is None or t2-t1 < best:
+            best=t2-t1
+    return best,G.order(),G.size()
+
+
+def main():
+    netfile=sys.argv[1]
+    repeat=3
+    if len(sys.argv) > 2:
+        repeat=int(sys.argv[2])
+    tmpdir=tempfile.mkdtemp()
+    try:
+        data=open(netfile,'rb').read()
+        plain=os.path.join(tmpdir,'net.txt')
+        open(plain,'wb').write(data)
+        gz=os.path.join(tmpdir,'net.txt.gz')
+        outfile=gzip.open(gz,'wb')
+        outfile.write(data)
+        outfile.close()
+        bz=os.path.join(tmpdir,'net.txt.bz2')
+        outfile=bz2.BZ2File(bz,'wb')
+        outfile.write(data)
+        outfile.close()
+
+        base=None
+        for name,path in [('plain',plain),('gzip',gz),('bz2',bz)]:
+            t,order,size=bench_read(path,repeat)
+            if base is None:
+                base=t
+            print '%s\t%d bytes\t%d nodes\t%d edges\t%.3fs\t%.2fx'%(name,os.path.getsize(path),
+                                                                order,size,t,t/base)
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__=='__main__':
+    main()
@@ -0,0 +1,46 @@
+'''
+Equivalence check of the vectorized edge passage times of limkWalks.
+Usage: python check_edge_passage.py [cases]
+edge_passage() and edge_passage_sparse() are compared with the loop of
+edge_passage_ref() on random lattices, with dense and sparse Qx, and with
+B=Lbeta[0,-1]=0. Raise AssertionError on a mismatch.
+'''
+import sys
+import numpy as np
+from scipy import sparse
+from kWalk import *
+
+
+def random_case(rs,zeroB=False):
+    m=rs.randint(2,40)
+    L=rs.randint(2,12)
+    Lalpha=rs.rand(m,L)
+    Lbeta=rs.rand(m,L)
+    if zeroB:
+        Lbeta[0,-1]=0
+    Qx=sparse.rand(m,m,density=rs.uniform(0.05,0.5),format='csr',random_state=rs)
+    return Lalpha,Qx,Lbeta
+
+
+def check(Lalpha,Qx,Lbeta,rtol=1e-12):
+    ref=edge_passage_ref(Lalpha,Qx,Lbeta)
+    scale=max(abs(ref).max(),1e-300)
+    for name,edgeM in [('dense Qx',edge_passage(Lalpha,Qx.toarray(),Lbeta)),
+                       ('sparse Qx',edge_passage(Lalpha,Qx,Lbeta)),
+                       ('sparse edges',edge_passage_sparse(Lalpha,Qx,Lbeta,chunksize=7).toarray())]:
+        err=abs(edgeM-ref).max()/scale
+        assert err <= rtol, '%s: relative error %g' %(name,err)
+
+
+def main():
+    cases=200
+    if len(sys.argv) > 1:
+        cases=int(sys.argv[1])
+    rs=np.random.RandomState(0)
+    for i in range(cases):
+        check(*random_case(rs,zeroB=(i%10==0)))
+    print '%d cases ok' %cases
+
+
+if __name__=='__main__':
+    main()
@@ -7,9 +7,29 @@ import numpy as np
 import os,sys
 import re
 import time
+import json
+import hashlib
+import multiprocessing
+import sqlite3
+import itertools
+import numbers
+import gzip
+import io
+import bz2
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma=None
+try:
+    from collections.abc import Mapping, MutableMapping
+except ImportError:
+    from collections import Mapping, MutableMapping
 
 
-def read_edgelist(path, comment='#',default_score=1):
+def read_edgelist(path, comment='#',default_score=1,cache=False,processes=1,compact=False):
     '''
     Return a graph object.
     Read the edgelist network file. 
@@ -17,9 +37,35 @@ def read_edgelist(path, comment='#',default_score=1):
     First two columns are genes, and the third column is positive edge scores. 
     Larger score indicates more relevant relationship.
     If the third column is omitted, default value is 1. 
+    If cache is True, the parsed network is also saved in binary form to 
+    "path.cache" (or to the directory given by cache), and later calls load it 
+    from there. The cache is rebuilt whenever the network file changes. 
+    If processes is not 1, the file is parsed in chunks by a process pool, 
+    see read_edge_arrays(). None means one process per CPU.
+    If compact is True, return a CSRGraph instead of nx.Graph. 
     '''
+    if cache:
+        cdir=_cache_dir(path,cache)
+        key=['edgelist',comment,default_score]
+        arrays=_load_cache(cdir,path,key)
+        if arrays is not None:
+            if compact:
+                return _csr2compact(arrays,_graph_name(path))
+            return _csr2graph(arrays,_graph_name(path))
+    if compact:
+        G=_arrays2compact(read_edge_arrays(path,comment,default_score,'edgelist',processes),
+                          _graph_name(path))
+        if cache:
+            _write_cache(cdir,path,key,_compact2csr(G,'score'))
+        return G
+    if processes!=1:
+        G=_arrays2graph(read_edge_arrays(path,comment,default_score,'edgelist',processes),
+                        _graph_name(path))
+        if cache:
+            _write_cache(cdir,path,key,_graph2csr(G,'score'))
+        return G
     infilename=path
-    infile=open(infilename)
+    infile=_open_input(infilename)
     basename=os.path.basename(infilename)
     pref=basename.split('.')[0]
     G=nx.Graph(name=pref)
@@ -44,17 +90,39 @@ def read_edgelist(path, comment='#',default_score=1):
     infile.close()
     if neg_warning:
         raise Exception('Edge scores should be positive!')
-    else:
-        return G
+    if cache:
+        _write_cache(cdir,path,key,_graph2csr(G,'score'))
+    return G
 
 
-def read_sif(path, comment='#'):
+def read_sif(path, comment='#',cache=False,processes=1,compact=False):
     '''
     Return a graph object.
     For test only, since SIF format doesn't have edge information.
+    The cache, processes and compact options are the same as in read_edgelist().
     '''
+    if cache:
+        cdir=_cache_dir(path,cache)
+        key=['sif',comment]
+        arrays=_load_cache(cdir,path,key)
+        if arrays is not None:
+            if compact:
+                return _csr2compact(arrays,_graph_name(path))
+            return _csr2graph(arrays,_graph_name(path))
+    if compact:
+        G=_arrays2compact(read_edge_arrays(path,comment,fmt='sif',processes=processes),
+                          _graph_name(path))
+        if cache:
+            _write_cache(cdir,path,key,_compact2csr(G))
+        return G
+    if processes!=1:
+        G=_arrays2graph(read_edge_arrays(path,comment,fmt='sif',processes=processes),
+                        _graph_name(path))
+        if cache:
+            _write_cache(cdir,path,key,_graph2csr(G))
+        return G
     infilename=path
-    infile=open(infilename)
+    infile=_open_input(infilename)
     basename=os.path.basename(infilename)
     pref=basename.split('.')[0]
     G=nx.Graph(name=pref)
@@ -67,16 +135,962 @@ def read_sif(path, comment='#'):
             gA, gB=info[0],info[2]
             G.add_edge(gA,gB)
     infile.close()
+    if cache:
+        _write_cache(cdir,path,key,_graph2csr(G))
+    return G
+
+
+def read_edge_arrays(path, comment='#',default_score=1,fmt='edgelist',processes=None,
+                     chunksize=1<<26):
+    '''
+    Return a tuple (labels, src, dst, score) of NumPy arrays.
+    labels is the node label table, src and dst are label indices of the edges 
+    in file order, score is the edge score (None for SIF files).
+    fmt is 'edgelist' or 'sif', parsed with the same rules as read_edgelist() 
+    and read_sif(). The file is split into byte ranges of about chunksize 
+    bytes at line boundaries, and the ranges are parsed by a pool of processes.
+    Compressed files can't be split, they are parsed as one stream.
+    '''
+    if processes is None:
+        processes=multiprocessing.cpu_count()
+    if _compression(path):
+        tasks=[(path,None,None,comment,default_score,fmt)]
+    else:
+        size=os.path.getsize(path)
+        nchunks=max(processes,size//chunksize+1)
+        bounds=_chunk_bounds(path,nchunks)
+        tasks=[(path,bounds[i],bounds[i+1],comment,default_score,fmt) for i in range(len(bounds)-1)]
+    if processes > 1 and len(tasks) > 1:
+        pool=multiprocessing.Pool(processes)
+        try:
+            parts=pool.map(_parse_chunk,tasks)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        parts=[_parse_chunk(task) for task in tasks]
+
+    if max([part[3] for part in parts] or [0]):
+        raise Exception('Edge scores should be positive!')
+    ends=np.concatenate([part[0] for part in parts]+[part[1] for part in parts])
+    labels,ids=np.unique(ends,return_inverse=True)
+    m=len(ends)//2
+    if fmt=='sif':
+        score=None
+    else:
+        score=np.concatenate([part[2] for part in parts])
+    return (labels,ids[:m],ids[m:],score)
+
+
+def _chunk_bounds(path,nchunks):
+    '''
+    Return byte offsets splitting the file into nchunks ranges at line boundaries.
+    '''
+    size=os.path.getsize(path)
+    bounds=[0]
+    infile=open(path,'rb')
+    for i in range(1,nchunks):
+        infile.seek(size*i//nchunks)
+        infile.readline()    #move to the start of the next line
+        pos=infile.tell()
+        if bounds[-1] < pos < size:
+            bounds.append(pos)
+    infile.close()
+    bounds.append(size)
+    return bounds
+
+
+def _parse_chunk(task):
+    '''
+    Parse one byte range of an edgelist or SIF file, for read_edge_arrays().
+    If the range is None, the whole file is streamed.
+    '''
+    path,start,end,comment,default_score,fmt=task
+    if start is None:
+        infile=_open_input(path)
+        lines=infile
+    else:
+        infile=open(path,'rb')
+        infile.seek(start)
+        lines=infile.read(end-start).splitlines()
+    us=[]
+    vs=[]
+    ws=[]
+    neg_warning=0
+    for line in lines:
+        line=line.strip()
+        if line.startswith(comment):
+            continue
+        elif line:
+            info=line.split()
+            if fmt=='sif':
+                us.append(info[0])
+                vs.append(info[2])
+                continue
+            if len(info) >=3:
+                try:
+                    w=float(info[2])
+                    if w <= 0:
+                        neg_warning=1
+                except ValueError:
+                    raise Exception('The third columne of network file should be edge score!')
+            else:
+                w=default_score
+            us.append(info[0])
+            vs.append(info[1])
+            ws.append(w)
+    infile.close()
+    return (np.array(us,dtype=str),np.array(vs,dtype=str),np.array(ws,dtype=float),neg_warning)
+
+
+def iter_edges(path, comment='#',default_score=1,fmt='edgelist',nodes=None,both=False,
+               min_score=None,batch=None):
+    '''
+    Iterate the edges of a network file without building the graph.
+    Yield (u, v, score) tuples in file order, or NumPy record arrays of up to 
+    batch edges with fields u, v and score if batch is given. 
+    fmt is 'edgelist' or 'sif', parsed as in read_edgelist() and read_sif(). 
+    SIF edges have score None. 
+    Filters: with nodes, only edges touching a node in nodes are kept, or 
+    edges with both ends in nodes if both is True. With min_score, only edges 
+    with score larger than min_score are kept.
+    Unlike read_edgelist(), a non-positive score raises as soon as it is read.
+    For example, a subgraph can be read with
+    nx.Graph(((u,v,{'score':w}) for u,v,w in iter_edges(path,nodes=genes,both=True)))
+    '''
+    records=_iter_edges(path,comment,default_score,fmt,nodes,both,min_score)
+    if batch is None:
+        return records
+    return _batches(records,batch)
+
+
+_edge_dtype=[('u',object),('v',object),('score',float)]
+
+
+def _iter_edges(path,comment,default_score,fmt,nodes,both,min_score):
+    if nodes is not None:
+        nodes=set(nodes)
+    infile=_open_input(path)
+    try:
+        for line in infile:
+            line=line.strip()
+            if line.startswith(comment) or not line:
+                continue
+            info=line.split()
+            if fmt=='sif':
+                u,v,w=info[0],info[2],None
+            else:
+                u,v=info[0],info[1]
+                if len(info) >=3:
+                    try:
+                        w=float(info[2])
+                    except ValueError:
+                        raise Exception('The third columne of network file should be edge score!')
+                    if w <= 0:
+                        raise Exception('Edge scores should be positive!')
+                else:
+                    w=default_score
+            if nodes is not None:
+                if both:
+                    if u not in nodes or v not in nodes:
+                        continue
+                elif u not in nodes and v not in nodes:
+                    continue
+            if min_score is not None and (w is None or w <= min_score):
+                continue
+            yield (u,v,w)
+    finally:
+        infile.close()
+
+
+def _batches(records,batch):
+    while True:
+        chunk=list(itertools.islice(records,batch))
+        if not chunk:
+            break
+        out=np.empty(len(chunk),dtype=_edge_dtype)
+        out[:]=chunk
+        yield out.view(np.recarray)
+
+
+def _arrays2graph(arrays,name=None):
+    '''
+    Return a graph object built from the output of read_edge_arrays().
+    '''
+    labels,src,dst,score=arrays
+    labels=labels.tolist()
+    G=nx.Graph(name=name)
+    if score is None:
+        G.add_edges_from((labels[u],labels[v]) for u,v in zip(src.tolist(),dst.tolist()))
+    else:
+        G.add_edges_from((labels[u],labels[v],{'score':w})
+                         for u,v,w in zip(src.tolist(),dst.tolist(),score.tolist()))
+    return G
+
+
+#################################################################################
+#compressed input.
+#input files may be gzip, bz2 or xz compressed, detected from the magic bytes, 
+#and are decompressed as a stream while reading.
+
+_magic=[('\x1f\x8b','gzip'),('BZh','bz2'),('\xfd7zXZ\x00','xz')]
+
+
+def _compression(path):
+    '''
+    Return 'gzip', 'bz2', 'xz' or None.
+    '''
+    infile=open(path,'rb')
+    head=infile.read(6)
+    infile.close()
+    for magic,method in _magic:
+        if head.startswith(magic):
+            return method
+    return None
+
+
+def _open_input(path):
+    '''
+    Open an input file for reading lines, decompressing it if needed.
+    '''
+    method=_compression(path)
+    if method=='gzip':
+        #GzipFile line iteration is slow, read through a buffer.
+        return io.BufferedReader(gzip.open(path,'rb'))
+    if method=='bz2':
+        return bz2.BZ2File(path,'rb')
+    if method=='xz':
+        if lzma is None:
+            raise Exception('Reading xz compressed files needs the lzma module!')
+        return lzma.open(path,'rb')
+    return open(path)
+
+
+#################################################################################
+#binary network cache.
+#a cache directory holds the node label table and the CSR adjacency of the network
+#(offsets, neighbors and edge scores), one .npy file each, so they can be memory-mapped.
+#meta.json records the size, mtime and md5 of the source file for invalidation.
+
+def _graph_name(path):
+    return os.path.basename(path).split('.')[0]
+
+
+def _cache_dir(path,cache):
+    if cache is True:
+        return path+'.cache'
+    return cache
+
+
+def _file_md5(path,blocksize=1<<20):
+    h=hashlib.md5()
+    infile=open(path,'rb')
+    while True:
+        block=infile.read(blocksize)
+        if not block:
+            break
+        h.update(block)
+    infile.close()
+    return h.hexdigest()
+
+
+def _graph2csr(G,attr=None):
+    '''
+    Return a dictionary of CSR arrays for G.
+    Every undirected edge is stored in both directions, self loops once.
+    '''
+    labels=G.nodes()
+    pos=dict((node,i) for i,node in enumerate(labels))
+    indptr=np.zeros(len(labels)+1,dtype=np.int64)
+    indices=[]
+    score=[]
+    for i,node in enumerate(labels):
+        nbrs=G[node]
+        indptr[i+1]=indptr[i]+len(nbrs)
+        for nbr in nbrs:
+            indices.append(pos[nbr])
+            if attr:
+                score.append(nbrs[nbr][attr])
+    arrays={'labels':np.array(labels),'indptr':indptr,
+            'indices':np.array(indices,dtype=np.int64)}
+    if attr:
+        arrays[attr]=np.array(score,dtype=float)
+    return arrays
+
+
+def _csr2graph(arrays,name=None):
+    '''
+    Return a graph object built from CSR arrays.
+    '''
+    labels=arrays['labels'].tolist()
+    indptr=arrays['indptr']
+    indices=arrays['indices']
+    rows=np.repeat(np.arange(len(labels)),np.diff(indptr))
+    upper=indices >= rows    #each undirected edge once
+    us=rows[upper].tolist()
+    vs=indices[upper].tolist()
+    G=nx.Graph(name=name)
+    G.add_nodes_from(labels)
+    if 'score' in arrays:
+        ws=arrays['score'][upper].tolist()
+        G.add_edges_from((labels[u],labels[v],{'score':w}) for u,v,w in zip(us,vs,ws))
+    else:
+        G.add_edges_from((labels[u],labels[v]) for u,v in zip(us,vs))
     return G
+
+
+def _load_cache(cdir,path,key):
+    '''
+    Return the memory-mapped cache arrays, or None if the cache is missing or stale.
+    '''
+    metafile=os.path.join(cdir,'meta.json')
+    if not os.path.exists(metafile):
+        return None
+    infile=open(metafile)
+    meta=json.load(infile)
+    infile.close()
+    st=os.stat(path)
+    if meta['key']!=key or meta['size']!=st.st_size:
+        return None
+    if meta['mtime']!=st.st_mtime:
+        #touched but maybe not modified, compare the content hash.
+        if meta['md5']!=_file_md5(path):
+            return None
+        meta['mtime']=st.st_mtime
+        outfile=open(metafile,'w')
+        json.dump(meta,outfile)
+        outfile.close()
+    arrays={}
+    for name in meta['arrays']:
+        arrays[name]=np.load(os.path.join(cdir,name+'.npy'),mmap_mode='r')
+    return arrays
+
+
+def _write_cache(cdir,path,key,arrays):
+    '''
+    Save arrays to the cache directory. meta.json is written last, so an
+    interrupted write leaves no valid cache behind.
+    '''
+    if not os.path.isdir(cdir):
+        os.makedirs(cdir)
+    metafile=os.path.join(cdir,'meta.json')
+    if os.path.exists(metafile):
+        os.remove(metafile)
+    for name in arrays:
+        np.save(os.path.join(cdir,name+'.npy'),arrays[name])
+    st=os.stat(path)
+    meta={'key':key,'size':st.st_size,'mtime':st.st_mtime,
+          'md5':_file_md5(path),'arrays':sorted(arrays.keys())}
+    outfile=open(metafile,'w')
+    json.dump(meta,outfile)
+    outfile.close()
   
 
+#################################################################################
+#compact graph.
+#CSRGraph keeps the network as arrays: a node label table, CSR adjacency and
+#attribute columns, instead of the dict-of-dicts of nx.Graph.
+
+class CSRGraph(object):
+    '''
+    Read-only graph with integer node ids and CSR adjacency.
+    It implements the part of the networkx Graph API used by GenRev modules, 
+    so it can be used in place of nx.Graph with much less memory. 
+    labels: node label table, node i is labels[i].
+    eu,ev: edge end points, edge e is (labels[eu[e]],labels[ev[e]]).
+    indptr,indices: CSR adjacency, neighbors of node i are indices[indptr[i]:indptr[i+1]],
+    and eid gives the edge id of each adjacency entry.
+    node_data,edge_data: attribute columns, arrays indexed by node id and edge id.
+    Attributes can be set, but nodes and edges can't be added or removed. 
+    copy() returns a mutable nx.Graph.
+    '''
+    def __init__(self,labels,eu,ev,edge_data=None,node_data=None,name=''):
+        self.labels=list(labels)
+        self.index=dict((node,i) for i,node in enumerate(self.labels))
+        n=len(self.labels)
+        self.eu=np.asarray(eu,dtype=np.int32)
+        self.ev=np.asarray(ev,dtype=np.int32)
+        loop=self.eu==self.ev
+        rows=np.concatenate((self.eu,self.ev[~loop]))
+        cols=np.concatenate((self.ev,self.eu[~loop]))
+        eid=np.concatenate((np.arange(len(self.eu)),np.nonzero(~loop)[0]))
+        order=np.lexsort((cols,rows))    #neighbors are sorted within each row
+        self.indices=cols[order].astype(np.int32)
+        self.eid=eid[order].astype(np.int32)
+        self.indptr=np.zeros(n+1,dtype=np.int64)
+        np.cumsum(np.bincount(rows,minlength=n),out=self.indptr[1:])
+        #self loop is counted twice, as in networkx.
+        self._degree=np.diff(self.indptr)+np.bincount(self.eu[loop],minlength=n)
+        self.node_data=dict(node_data or {})
+        self.edge_data=dict(edge_data or {})
+        self.graph={'name':name}
+
+    @property
+    def name(self):
+        return self.graph.get('name','')
+
+    @name.setter
+    def name(self,s):
+        self.graph['name']=s
+
+    @property
+    def node(self):
+        return _NodeView(self)
+
+    @property
+    def edge(self):
+        return _AdjView(self)
+
+    adj=edge
+
+    def __iter__(self):
+        return iter(self.labels)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __contains__(self,n):
+        try:
+            return n in self.index
+        except TypeError:
+            return False
+
+    def __getitem__(self,n):
+        return _NbrView(self,self.index[n])
+
+    def _nbrs(self,i):
+        return self.indices[self.indptr[i]:self.indptr[i+1]]
+
+    def _entry(self,i,j):
+        #position of j in the adjacency row of i, or None
+        lo,hi=self.indptr[i],self.indptr[i+1]
+        p=lo+np.searchsorted(self.indices[lo:hi],j)
+        if p < hi and self.indices[p]==j:
+            return p
+        return None
+
+    def _nbunch(self,nbunch):
+        if nbunch is None:
+            return self.labels
+        if nbunch in self:
+            return [nbunch]
+        return [n for n in nbunch if n in self]
+
+    def is_directed(self):
+        return False
+
+    def is_multigraph(self):
+        return False
+
+    def order(self):
+        return len(self.labels)
+
+    number_of_nodes=order
+
+    def has_node(self,n):
+        return n in self
+
+    def nodes(self,data=False):
+        if data:
+            return [(n,self.node[n]) for n in self.labels]
+        return list(self.labels)
+
+    def nodes_iter(self,data=False):
+        return iter(self.nodes(data))
+
+    def neighbors(self,n):
+        labels=self.labels
+        return [labels[j] for j in self._nbrs(self.index[n]).tolist()]
+
+    def neighbors_iter(self,n):
+        return iter(self.neighbors(n))
+
+    def has_edge(self,u,v):
+        try:
+            i,j=self.index[u],self.index[v]
+        except (KeyError,TypeError):
+            return False
+        return self._entry(i,j) is not None
+
+    def edges(self,nbunch=None,data=False):
+        '''
+        Return a list of edges. Without nbunch, edges are in edge id order.
+        '''
+        labels=self.labels
+        if nbunch is None:
+            if data:
+                return [(labels[u],labels[v],_AttrView(self.edge_data,e,len(self.eu)))
+                        for e,(u,v) in enumerate(zip(self.eu.tolist(),self.ev.tolist()))]
+            return [(labels[u],labels[v]) for u,v in zip(self.eu.tolist(),self.ev.tolist())]
+        es=[]
+        seen=set()
+        for n in self._nbunch(nbunch):
+            i=self.index[n]
+            lo,hi=self.indptr[i],self.indptr[i+1]
+            for j,e in zip(self.indices[lo:hi].tolist(),self.eid[lo:hi].tolist()):
+                if j not in seen:
+                    if data:
+                        es.append((n,labels[j],_AttrView(self.edge_data,e,len(self.eu))))
+                    else:
+                        es.append((n,labels[j]))
+            seen.add(i)
+        return es
+
+    def edges_iter(self,nbunch=None,data=False):
+        return iter(self.edges(nbunch,data))
+
+    def size(self,weighted=False):
+        if weighted:
+            if 'weight' in self.edge_data:
+                return self._weights().sum()
+            return float(len(self.eu))    #all weights 1, as nx.Graph
+        return len(self.eu)
+
+    def _weights(self):
+        '''
+        Edge weights as floats, a missing weight (NaN) is 1 as in nx.Graph.
+        '''
+        w=np.array(self.edge_data['weight'],dtype=float)
+        w[np.isnan(w)]=1
+        return w
+
+    def number_of_edges(self,u=None,v=None):
+        if u is None:
+            return len(self.eu)
+        return int(self.has_edge(u,v))
+
+    def degree(self,nbunch=None,weighted=False):
+        '''
+        Return the degree of a node, or a dictionary of degrees.
+        '''
+        if weighted and 'weight' in self.edge_data:
+            w=self._weights()
+            dg=np.bincount(self.eu,w,len(self))+np.bincount(self.ev,w,len(self))
+        else:
+            dg=self._degree
+        if nbunch in self:
+            return dg[self.index[nbunch]].item()
+        return dict((n,dg[self.index[n]].item()) for n in self._nbunch(nbunch))
+
+    def degree_iter(self,nbunch=None,weighted=False):
+        return iter(self.degree(self._nbunch(nbunch),weighted).items())
+
+    def adjacency_iter(self):
+        for i,n in enumerate(self.labels):
+            yield (n,_NbrView(self,i))
+
+    def subgraph(self,nbunch):
+        '''
+        Return the CSRGraph induced on nodes in nbunch. 
+        Unlike nx.Graph.subgraph(), attribute columns are copied, not shared.
+        '''
+        keep=np.zeros(len(self),dtype=bool)
+        keep[[self.index[n] for n in self._nbunch(nbunch)]]=True
+        newid=np.cumsum(keep)-1
+        emask=keep[self.eu] & keep[self.ev]
+        labels=[self.labels[i] for i in np.nonzero(keep)[0].tolist()]
+        node_data=dict((attr,col[keep]) for attr,col in self.node_data.items())
+        edge_data=dict((attr,col[emask]) for attr,col in self.edge_data.items())
+        return CSRGraph(labels,newid[self.eu[emask]],newid[self.ev[emask]],
+                        edge_data,node_data,self.name)
+
+    def copy(self):
+        '''
+        Return a mutable nx.Graph copy with all attributes.
+        '''
+        G=nx.Graph(name=self.name)
+        G.add_nodes_from((n,dict(self.node[n])) for n in self.labels)
+        G.add_edges_from((u,v,dict(d)) for u,v,d in self.edges(data=True))
+        return G
+
+    def _readonly(self,*args,**kwds):
+        raise Exception('CSRGraph is read-only, use copy() to get a mutable graph!')
+
+    add_node=add_nodes_from=remove_node=remove_nodes_from=_readonly
+    add_edge=add_edges_from=remove_edge=remove_edges_from=add_path=clear=_readonly
+
+
+class _AttrView(MutableMapping):
+    '''
+    Attribute dictionary of one node or edge, backed by attribute columns.
+    '''
+    def __init__(self,columns,i,size):
+        self._columns=columns
+        self._i=i
+        self._size=size
+
+    def __getitem__(self,attr):
+        return self._columns[attr][self._i]
+
+    def __setitem__(self,attr,value):
+        columns=self._columns
+        if attr not in columns:
+            columns[attr]=_new_column(value,self._size)
+        elif columns[attr].dtype!=object and not isinstance(value,numbers.Number):
+            columns[attr]=columns[attr].astype(object)
+        columns[attr][self._i]=value
+
+    def __delitem__(self,attr):
+        raise Exception('Attribute columns can not be deleted by element!')
+
+    def __iter__(self):
+        return iter(self._columns)
+
+    def __len__(self):
+        return len(self._columns)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class _NbrView(Mapping):
+    '''
+    Neighbor dictionary of node i, values are edge attribute dictionaries.
+    '''
+    def __init__(self,G,i):
+        self._G=G
+        self._i=i
+
+    def __getitem__(self,n):
+        G=self._G
+        p=G._entry(self._i,G.index[n])
+        if p is None:
+            raise KeyError(n)
+        return _AttrView(G.edge_data,G.eid[p],len(G.eu))
+
+    def __iter__(self):
+        labels=self._G.labels
+        return iter([labels[j] for j in self._G._nbrs(self._i).tolist()])
+
+    def __len__(self):
+        return len(self._G._nbrs(self._i))
+
+
+class _NodeView(Mapping):
+    def __init__(self,G):
+        self._G=G
+
+    def __getitem__(self,n):
+        return _AttrView(self._G.node_data,self._G.index[n],len(self._G))
+
+    def __iter__(self):
+        return iter(self._G.labels)
+
+    def __len__(self):
+        return len(self._G)
+
+
+class _AdjView(_NodeView):
+    def __getitem__(self,n):
+        return _NbrView(self._G,self._G.index[n])
+
+
+class GraphOverlay(object):
+    '''
+    Read-only view of graph G restricted to nodes, with its own node attribute 
+    columns. No node or edge data of G is copied.
+    node_data: attribute columns aligned with nodes. Node attributes are looked 
+    up in node_data first and then in G; setting them writes node_data only.
+    Edge attributes are those of G, so setting them changes G, as with the 
+    subgraphs of nx.Graph.
+    subgraph() returns an overlay of the same G, copy() a mutable nx.Graph.
+    '''
+    def __init__(self,G,nodes,node_data=None):
+        self.base=G
+        self.labels=list(nodes)
+        self.index=dict((node,i) for i,node in enumerate(self.labels))
+        self.node_data=dict(node_data or {})
+        self.graph={'name':G.name}
+
+    @property
+    def name(self):
+        return self.graph.get('name','')
+
+    @name.setter
+    def name(self,s):
+        self.graph['name']=s
+
+    @property
+    def node(self):
+        return _OverlayNodeView(self)
+
+    @property
+    def edge(self):
+        return _OverlayAdjView(self)
+
+    adj=edge
+
+    def __iter__(self):
+        return iter(self.labels)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __contains__(self,n):
+        try:
+            return n in self.index
+        except TypeError:
+            return False
+
+    def __getitem__(self,n):
+        if n not in self:
+            raise KeyError(n)
+        return _FilteredNbrView(self.base[n],self.index)
+
+    def _nbunch(self,nbunch):
+        if nbunch is None:
+            return self.labels
+        if nbunch in self:
+            return [nbunch]
+        return [n for n in nbunch if n in self]
+
+    def is_directed(self):
+        return False
+
+    def is_multigraph(self):
+        return False
+
+    def order(self):
+        return len(self.labels)
+
+    number_of_nodes=order
+
+    def has_node(self,n):
+        return n in self
+
+    def nodes(self,data=False):
+        if data:
+            return [(n,self.node[n]) for n in self.labels]
+        return list(self.labels)
+
+    def nodes_iter(self,data=False):
+        return iter(self.nodes(data))
+
+    def neighbors(self,n):
+        return list(self[n])
+
+    def neighbors_iter(self,n):
+        return iter(self[n])
+
+    def has_edge(self,u,v):
+        return u in self and v in self and self.base.has_edge(u,v)
+
+    def edges(self,nbunch=None,data=False):
+        es=[]
+        for e in self.base.edges_iter(self._nbunch(nbunch),data):
+            if e[1] in self.index:
+                es.append(e)
+        return es
+
+    def edges_iter(self,nbunch=None,data=False):
+        return iter(self.edges(nbunch,data))
+
+    def size(self,weighted=False):
+        if weighted:
+            return sum(d.get('weight',1) for u,v,d in self.edges(data=True))
+        return len(self.edges())
+
+    def number_of_edges(self,u=None,v=None):
+        if u is None:
+            return self.size()
+        return int(self.has_edge(u,v))
+
+    def degree(self,nbunch=None,weighted=False):
+        '''
+        Return the degree of a node, or a dictionary of degrees, counting only 
+        edges inside the overlay.
+        '''
+        dg={}
+        for n in self._nbunch(nbunch):
+            nbrs=self[n]
+            if weighted:
+                d=sum(nbrs[nbr].get('weight',1) for nbr in nbrs)
+            else:
+                d=len(nbrs)
+            if n in nbrs:    #self loop is counted twice.
+                d=d+(nbrs[n].get('weight',1) if weighted else 1)
+            dg[n]=d
+        if nbunch in self:
+            return dg[nbunch]
+        return dg
+
+    def degree_iter(self,nbunch=None,weighted=False):
+        return iter(self.degree(self._nbunch(nbunch),weighted).items())
+
+    def adjacency_iter(self):
+        for n in self.labels:
+            yield (n,self[n])
+
+    def subgraph(self,nbunch):
+        '''
+        Return the overlay of the same base graph induced on nodes in nbunch. 
+        Node attribute columns are sliced, base graph data is shared.
+        '''
+        nodes=self._nbunch(nbunch)
+        pos=[self.index[n] for n in nodes]
+        node_data=dict((attr,col[pos]) for attr,col in self.node_data.items())
+        return GraphOverlay(self.base,nodes,node_data)
+
+    def copy(self):
+        '''
+        Return a mutable nx.Graph copy with all attributes.
+        '''
+        G=nx.Graph(name=self.name)
+        G.add_nodes_from((n,dict(self.node[n])) for n in self.labels)
+        G.add_edges_from((u,v,dict(d)) for u,v,d in self.edges(data=True))
+        return G
+
+    def _readonly(self,*args,**kwds):
+        raise Exception('GraphOverlay is read-only, use copy() to get a mutable graph!')
+
+    add_node=add_nodes_from=remove_node=remove_nodes_from=_readonly
+    add_edge=add_edges_from=remove_edge=remove_edges_from=add_path=clear=_readonly
+
+
+class _OverlayAttrView(_AttrView):
+    '''
+    Node attribute dictionary of a GraphOverlay, columns first, then the base graph.
+    '''
+    def __init__(self,columns,i,size,base):
+        _AttrView.__init__(self,columns,i,size)
+        self._base=base
+
+    def __getitem__(self,attr):
+        if attr in self._columns:
+            return self._columns[attr][self._i]
+        return self._base[attr]
+
+    def __iter__(self):
+        return iter(set(self._columns) | set(self._base))
+
+    def __len__(self):
+        return len(set(self._columns) | set(self._base))
+
+
+class _OverlayNodeView(_NodeView):
+    def __getitem__(self,n):
+        G=self._G
+        return _OverlayAttrView(G.node_data,G.index[n],len(G),G.base.node[n])
+
+
+class _OverlayAdjView(_NodeView):
+    def __getitem__(self,n):
+        return self._G[n]
+
+
+class _FilteredNbrView(Mapping):
+    '''
+    Neighbor dictionary of the base graph, restricted to nodes in index.
+    '''
+    def __init__(self,nbrs,index):
+        self._nbrs=nbrs
+        self._index=index
+
+    def __getitem__(self,n):
+        if n not in self._index:
+            raise KeyError(n)
+        return self._nbrs[n]
+
+    def __contains__(self,n):
+        return n in self._index and n in self._nbrs
+
+    def __iter__(self):
+        index=self._index
+        return iter([n for n in self._nbrs if n in index])
+
+    def __len__(self):
+        return len([n for n in self._nbrs if n in self._index])
+
+
+def _new_column(value,size):
+    if isinstance(value,numbers.Number) and not isinstance(value,bool):
+        col=np.empty(size,dtype=float)
+        col.fill(np.nan)
+    else:
+        col=np.empty(size,dtype=object)
+    return col
+
+
+def _columns(dicts,size):
+    '''
+    Return attribute columns collected from a sequence of attribute dictionaries.
+    '''
+    columns={}
+    for i,d in enumerate(dicts):
+        for attr,value in d.items():
+            if attr not in columns:
+                columns[attr]=_new_column(value,size)
+            elif columns[attr].dtype!=object and not isinstance(value,numbers.Number):
+                columns[attr]=columns[attr].astype(object)
+            columns[attr][i]=value
+    return columns
+
+
+def compact_graph(G):
+    '''
+    Return a CSRGraph copy of networkx graph G, with node and edge attributes 
+    stored as columns.
+    '''
+    labels=G.nodes()
+    pos=dict((node,i) for i,node in enumerate(labels))
+    edges=G.edges(data=True)
+    eu=[pos[u] for u,v,d in edges]
+    ev=[pos[v] for u,v,d in edges]
+    node_data=_columns([G.node[n] for n in labels],len(labels))
+    edge_data=_columns([d for u,v,d in edges],len(edges))
+    return CSRGraph(labels,eu,ev,edge_data,node_data,G.name)
+
+
+def _arrays2compact(arrays,name=''):
+    '''
+    Return a CSRGraph built from the output of read_edge_arrays().
+    Duplicated edges are merged, the last score wins as in nx.Graph.add_edge().
+    '''
+    labels,src,dst,score=arrays
+    n=len(labels)
+    a=np.minimum(src,dst).astype(np.int64)
+    b=np.maximum(src,dst).astype(np.int64)
+    key=a*n+b
+    m=len(key)
+    ukey,last=np.unique(key[::-1],return_index=True)
+    last=m-1-last
+    edge_data={}
+    if score is not None:
+        edge_data['score']=score[last]
+    return CSRGraph(labels.tolist(),a[last],b[last],edge_data,name=name)
+
+
+def _csr2compact(arrays,name=''):
+    '''
+    Return a CSRGraph built from CSR arrays, see _graph2csr().
+    '''
+    indptr=arrays['indptr']
+    indices=arrays['indices']
+    rows=np.repeat(np.arange(len(indptr)-1),np.diff(indptr))
+    upper=indices >= rows
+    edge_data={}
+    if 'score' in arrays:
+        edge_data['score']=np.array(arrays['score'][upper])
+    return CSRGraph(arrays['labels'].tolist(),rows[upper],indices[upper],edge_data,name=name)
+
+
+def _compact2csr(G,attr=None):
+    '''
+    Return a dictionary of CSR arrays for CSRGraph G, see _graph2csr().
+    '''
+    arrays={'labels':np.array(G.labels),'indptr':G.indptr,'indices':G.indices}
+    if attr:
+        arrays[attr]=G.edge_data[attr][G.eid]
+    return arrays
+
+
 def read_nodes(path, comment='#',default_score=1):
     '''
     Return a dictionary, key is node, value is score.
     Read node information from space or tab delimited files.
     Second column is positive scores. If omitted, default value is 1. 
     '''
-    infile=open(path)
+    infile=_open_input(path)
     nodes={}
     neg_warning=0
     for line in infile:
@@ -109,7 +1123,7 @@ def read_terminals(path):
     Terminal file is single column, each line is a terminal. 
     '''
     terminals=set()
-    infile=open(path)
+    infile=_open_input(path)
     for line in infile:
         info=line.strip()
         if info:
@@ -118,12 +1132,118 @@ def read_terminals(path):
     return terminals
 
 
-def layNode2Graph(G,node_info,attr='score'):
+class TerminalCorpus(object):
+    '''
+    A collection of terminal sets, e.g. one per pathway, stored as a sparse 
+    pathway x gene incidence matrix.
+    names: set names, row i is names[i].
+    genes: gene label table, column j is genes[j].
+    indptr,indices: CSR rows, terminals of set i are genes[indices[indptr[i]:indptr[i+1]]].
+    corpus[name] returns the terminal set as read_terminals() does.
+    '''
+    def __init__(self,names,genes,indptr,indices,signature=''):
+        self.names=list(names)
+        self.genes=list(genes)
+        self.index=dict((name,i) for i,name in enumerate(self.names))
+        self.indptr=np.asarray(indptr,dtype=np.int64)
+        self.indices=np.asarray(indices,dtype=np.int32)
+        self.signature=signature
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __contains__(self,name):
+        return name in self.index
+
+    def __getitem__(self,name):
+        i=self.index[name]
+        genes=self.genes
+        return set(genes[j] for j in self.indices[self.indptr[i]:self.indptr[i+1]].tolist())
+
+    def matrix(self):
+        '''
+        Return the incidence matrix as scipy.sparse.csr_matrix.
+        '''
+        from scipy import sparse
+        data=np.ones(len(self.indices),dtype=np.int8)
+        return sparse.csr_matrix((data,self.indices,self.indptr),
+                                 shape=(len(self.names),len(self.genes)))
+
+    def save(self,path):
+        '''
+        Save the corpus to a single .npz file.
+        '''
+        outfile=open(path,'wb')
+        np.savez(outfile,names=np.array(self.names),genes=np.array(self.genes),
+                 indptr=self.indptr,indices=self.indices,signature=np.array(self.signature))
+        outfile.close()
+
+
+def read_terminal_corpus(path,packed=None):
+    '''
+    Return a TerminalCorpus.
+    path is a directory of terminal files, each named after its set, e.g. 
+    "12.txt" is set "12", or a file saved by TerminalCorpus.save(). 
+    If packed is given, the corpus is loaded from that file when it is up to 
+    date with the directory (same file names, sizes and mtimes), and 
+    otherwise read from the directory and saved there. 
+    '''
+    if os.path.isfile(path):
+        return _load_corpus(path)
+    files=[f for f in os.listdir(path)
+           if not f.startswith('.') and os.path.isfile(os.path.join(path,f))
+           and not (packed and os.path.abspath(os.path.join(path,f))==os.path.abspath(packed))]
+    files.sort(key=_natural_key)
+    signature=json.dumps([(f,os.path.getsize(os.path.join(path,f)),
+                           os.path.getmtime(os.path.join(path,f))) for f in files])
+    if packed and os.path.exists(packed):
+        corpus=_load_corpus(packed)
+        if corpus.signature==signature:
+            return corpus
+    genes=[]
+    gindex={}
+    indptr=[0]
+    indices=[]
+    for f in files:
+        for gene in read_terminals(os.path.join(path,f)):
+            if gene not in gindex:
+                gindex[gene]=len(genes)
+                genes.append(gene)
+            indices.append(gindex[gene])
+        indptr.append(len(indices))
+    names=[f.split('.')[0] for f in files]
+    corpus=TerminalCorpus(names,genes,indptr,indices,signature)
+    if packed:
+        corpus.save(packed)
+    return corpus
+
+
+def _load_corpus(path):
+    arrays=np.load(path)
+    return TerminalCorpus(arrays['names'].tolist(),arrays['genes'].tolist(),
+                          arrays['indptr'],arrays['indices'],arrays['signature'].item())
+
+
+def _natural_key(name):
+    #"2.txt" sorts before "10.txt"
+    return [int(x) if x.isdigit() else x for x in re.split('(\d+)',name)]
+
+
+def layNode2Graph(G,node_info,attr='score',overlay=False):
     '''
     Return the overlaid graph.
     Overlay node weights to a graph.
     If the node in G is not present in node_info, it will be omitted. 
+    If overlay is True, return a GraphOverlay view of G instead of a subgraph 
+    copy, with the node weights in an array aligned with its nodes.
     '''
+    if overlay:
+        nodes=[node for node in G if node in node_info]
+        scores=np.array([node_info[node] for node in nodes],dtype=float)
+        return GraphOverlay(G,nodes,{attr:scores})
     total=set(G.nodes())
     wN=set(node_info.keys())
     overlap=total & wN
@@ -139,8 +1259,13 @@ def mapAttr(G,entry='node',attr_from='score',attr_to='weight',f=lambda x:x):
     Since User input edge and node score, I have to define a function to map 
     these scores to weights. 'weight' attribute is used for calculation, so it's better
     to seperate with 'score' attribute.
+    For graphs with attribute columns (CSRGraph), f is applied to the whole 
+    column at once, so NumPy ufuncs like numpy.sqrt are vectorized.
     '''
-    if entry=='node':
+    columns=_columns_of(G,entry)
+    if columns is not None and attr_from in columns:    #else the attr may be on the base graph of an overlay
+        columns[attr_to]=_map_column(f,columns[attr_from])
+    elif entry=='node':
         for node in G:
             av1=G.node[node][attr_from]
             av2=f(av1)
@@ -159,6 +1284,9 @@ def setNodeScore(G, default=1):
     In place change G.
     Set node score to default.
     '''
+    if _columns_of(G,'node') is not None:
+        G.node_data['score']=_fill_column(default,G.order())
+        return
     for n in G:
         G.node[n]['score']=default
     #return G
@@ -169,10 +1297,39 @@ def setEdgeScore(G, default=1):
     In place change G.
     Set edge weight to default.
     '''
+    if _columns_of(G,'edge') is not None:
+        G.edge_data['score']=_fill_column(default,G.size())
+        return
     for n in G.edge:
         for neighbor in G.edge[n]:
             G.edge[n][neighbor]['score']=default
     #return G    
+
+
+def _columns_of(G,entry):
+    #attribute columns of graphs keeping attributes as arrays (CSRGraph), or None.
+    return getattr(G,entry+'_data',None)
+
+
+def _map_column(f,col):
+    '''
+    Return f applied to every element of column col.
+    f is called once on the whole column if it accepts arrays, otherwise 
+    element by element. The result never shares memory with col.
+    '''
+    try:
+        out=f(col)
+        if np.shape(out)==col.shape:
+            return np.array(out)    #a copy, f may return col itself
+    except (TypeError,ValueError):
+        pass
+    return np.array([f(x) for x in col.tolist()])
+
+
+def _fill_column(value,size):
+    col=_new_column(value,size)
+    col.fill(value)
+    return col
     
 
 def autoDetectDir(path,prefix='GenRev_analysis'):
@@ -253,13 +1410,222 @@ def writeNodeAttr(G,path,attrName='NodeCategory',attrValues=[], Class='String'):
         w=attrValues[i]
         outfile.write('%s = %s\n'%(gen,w))
     outfile.close()
+
+
+def writeCytoscape(G,sifPath,edgeAttrs=[],nodeAttrs=[],edgeType='ee',compress=False):
+    '''
+    Write the graph and its attributes to Cytoscape files in one pass.
+    This is the same output as writeSif(), writeEdgeAttr() and writeNodeAttr(), 
+    but edges and nodes are traversed only once for all files. 
+    edgeAttrs is a list of (path, attrName, attrValues, Class) tuples, one for 
+    each ".eda" file, and nodeAttrs is the same for ".noa" files. 
+    attrValues can be any iterable, e.g. list, array or generator, in the order 
+    of G.edges() or G.nodes(). 
+    If compress is True, files are gzipped and ".gz" is appended to the names.
+    '''
+    for path,attrName,attrValues,Class in edgeAttrs:
+        if hasattr(attrValues,'__len__') and len(attrValues)!=G.size():
+            raise Exception('Number of attribute values is not equal to network size!')
+    for path,attrName,attrValues,Class in nodeAttrs:
+        if hasattr(attrValues,'__len__') and len(attrValues)!=G.order():
+            raise Exception('Number of attribute values is not equal to network order!')
+
+    outfiles=[]
+    try:
+        sif=_LineWriter(sifPath,compress)
+        outfiles.append(sif)
+        edas=[]
+        for path,attrName,attrValues,Class in edgeAttrs:
+            outfile=_LineWriter(path,compress)
+            outfiles.append(outfile)
+            outfile.write('%s class=%s\n'%(attrName,Class))
+            edas.append((outfile,iter(attrValues)))
+        for gA,gB in G.edges_iter():
+            sif.write('%s\t%s\t%s\n'%(gA,edgeType,gB))
+            for outfile,values in edas:
+                w=next(values,_missing)
+                if w is _missing:
+                    raise Exception('Number of attribute values is not equal to network size!')
+                outfile.write('%s (%s) %s = %s\n'%(gA,edgeType,gB,w))
+        for outfile,values in edas:
+            if next(values,_missing) is not _missing:
+                raise Exception('Number of attribute values is not equal to network size!')
+
+        noas=[]
+        for path,attrName,attrValues,Class in nodeAttrs:
+            outfile=_LineWriter(path,compress)
+            outfiles.append(outfile)
+            outfile.write('%s class=%s\n'%(attrName,Class))
+            noas.append((outfile,iter(attrValues)))
+        if noas:
+            for gen in G.nodes_iter():
+                for outfile,values in noas:
+                    w=next(values,_missing)
+                    if w is _missing:
+                        raise Exception('Number of attribute values is not equal to network order!')
+                    outfile.write('%s = %s\n'%(gen,w))
+            for outfile,values in noas:
+                if next(values,_missing) is not _missing:
+                    raise Exception('Number of attribute values is not equal to network order!')
+    finally:
+        for outfile in outfiles:
+            outfile.close()
+
+
+_missing=object()
+
+
+class _LineWriter(object):
+    '''
+    Output file collecting lines in a buffer, written out in large blocks.
+    '''
+    def __init__(self,path,compress=False,buffer_lines=10000):
+        if compress:
+            self.outfile=gzip.open(path+'.gz','wb')
+        else:
+            self.outfile=open(path,'w')
+        self.buffer_lines=buffer_lines
+        self.lines=[]
+
+    def write(self,line):
+        self.lines.append(line)
+        if len(self.lines) >= self.buffer_lines:
+            self.flush()
+
+    def flush(self):
+        self.outfile.write(''.join(self.lines))
+        self.lines=[]
+
+    def close(self):
+        self.flush()
+        self.outfile.close()
    
 
+class ResultStore(object):
+    '''
+    Results of pathway batch runs, kept in one SQLite file instead of a few 
+    small files per pathway. 
+    Each record belongs to a pathway and a kind, e.g. "node" or "expanedge". 
+    Nodes are gene sets, edges are gene pairs and lines are free text. 
+    Writes are batched into one transaction until commit() or close(). 
+    Nodes are indexed by pathway and gene, edges by pathway and both genes.
+    export() writes the per-file layout: dirname/kind/pathway.txt.
+    '''
+    def __init__(self,path):
+        self.path=path
+        self.conn=sqlite3.connect(path)
+        self.conn.text_factory=str
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS nodes (pathway TEXT, kind TEXT, gene TEXT);
+            CREATE TABLE IF NOT EXISTS edges (pathway TEXT, kind TEXT, u TEXT, v TEXT);
+            CREATE TABLE IF NOT EXISTS lines (pathway TEXT, kind TEXT, seq INTEGER, line TEXT);
+            CREATE INDEX IF NOT EXISTS nodes_pathway ON nodes (pathway, kind);
+            CREATE INDEX IF NOT EXISTS nodes_gene ON nodes (gene);
+            CREATE INDEX IF NOT EXISTS edges_pathway ON edges (pathway, kind);
+            CREATE INDEX IF NOT EXISTS edges_u ON edges (u);
+            CREATE INDEX IF NOT EXISTS edges_v ON edges (v);
+            CREATE INDEX IF NOT EXISTS lines_pathway ON lines (pathway, kind);
+        ''')
+
+    def _replace(self,table,pathway,kind):
+        #rerunning a pathway replaces its old records
+        self.conn.execute('DELETE FROM %s WHERE pathway=? AND kind=?'%table,(pathway,kind))
+
+    def put_nodes(self,pathway,kind,genes):
+        self._replace('nodes',pathway,kind)
+        self.conn.executemany('INSERT INTO nodes VALUES (?,?,?)',
+                              ((pathway,kind,gene) for gene in genes))
+
+    def put_edges(self,pathway,kind,edges):
+        self._replace('edges',pathway,kind)
+        self.conn.executemany('INSERT INTO edges VALUES (?,?,?,?)',
+                              ((pathway,kind,u,v) for u,v in edges))
+
+    def put_lines(self,pathway,kind,lines):
+        self._replace('lines',pathway,kind)
+        self.conn.executemany('INSERT INTO lines VALUES (?,?,?,?)',
+                              ((pathway,kind,i,line) for i,line in enumerate(lines)))
+
+    def nodes(self,pathway,kind):
+        cur=self.conn.execute('SELECT gene FROM nodes WHERE pathway=? AND kind=? ORDER BY rowid',
+                              (pathway,kind))
+        return [row[0] for row in cur]
+
+    def edges(self,pathway,kind):
+        cur=self.conn.execute('SELECT u,v FROM edges WHERE pathway=? AND kind=? ORDER BY rowid',
+                              (pathway,kind))
+        return [tuple(row) for row in cur]
+
+    def lines(self,pathway,kind):
+        cur=self.conn.execute('SELECT line FROM lines WHERE pathway=? AND kind=? ORDER BY seq',
+                              (pathway,kind))
+        return [row[0] for row in cur]
+
+    def pathways(self,gene=None,kind=None):
+        '''
+        Return the pathways with records, or those having gene in their nodes or edges.
+        '''
+        if gene is None:
+            sql=('SELECT pathway FROM nodes UNION SELECT pathway FROM edges '
+                 'UNION SELECT pathway FROM lines')
+            args=()
+        else:
+            sql=('SELECT pathway FROM nodes WHERE gene=?%s UNION '
+                 'SELECT pathway FROM edges WHERE u=?%s UNION '
+                 'SELECT pathway FROM edges WHERE v=?%s')
+            cond=' AND kind=?' if kind else ''
+            sql=sql%(cond,cond,cond)
+            args=(gene,kind)*3 if kind else (gene,)*3
+        return [row[0] for row in self.conn.execute(sql,args)]
+
+    def kinds(self):
+        '''
+        Return a list of (table, kind) pairs in the store.
+        '''
+        kinds=[]
+        for table in ('nodes','edges','lines'):
+            for row in self.conn.execute('SELECT DISTINCT kind FROM %s'%table):
+                kinds.append((table,row[0]))
+        return kinds
+
+    def export(self,dirname,ext={}):
+        '''
+        Write the records to the per-file layout, dirname/kind/pathway + ext[kind] 
+        (default ".txt"). Nodes and lines are written one per line, edges as 
+        tab delimited pairs.
+        '''
+        self.commit()
+        for table,kind in self.kinds():
+            kdir=os.path.join(dirname,kind)
+            if not os.path.isdir(kdir):
+                os.makedirs(kdir)
+            cur=self.conn.execute('SELECT DISTINCT pathway FROM %s WHERE kind=?'%table,(kind,))
+            for pathway in [row[0] for row in cur]:
+                outfile=open(os.path.join(kdir,pathway+ext.get(kind,'.txt')),'w')
+                if table=='edges':
+                    for u,v in self.edges(pathway,kind):
+                        outfile.write('%s\t%s\n'%(u,v))
+                else:
+                    for item in getattr(self,table)(pathway,kind):
+                        outfile.write('%s\n'%item)
+                outfile.close()
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+
 def extNodeAttr(G,attr='weight'):
     '''
     Return the node attr list. The node attr value sequence is 
     corresponding to G.nodes()
+    For graphs with attribute columns, the column array itself is returned.
     ''' 
+    if attr in (_columns_of(G,'node') or {}):
+        return G.node_data[attr]
     wvec=[]
     for N in G.nodes():
         w=G.node[N][attr]
@@ -271,7 +1637,10 @@ def extEdgeAttr(G,attr='weight'):
     '''
     Return the edge attr list. The edge attr value sequence is 
     corresponding to G.edges()
+    For graphs with attribute columns, the column array itself is returned.
     '''
+    if attr in (_columns_of(G,'edge') or {}):
+        return G.edge_data[attr]
     wvec=[]
     for E in G.edges():
         gA,gB=E
@@ -292,50 +1661,70 @@ def determCat(G, subG=None, terminals=[]):
     Return a tuple of length 2, the first is node category list, the second is 
     edge category list. 
     '''
-    nodeCategory=[]
-    edgeCategory=[]
+    nodeCodes,edgeCodes,nodeTable,edgeTable=determCatCodes(G,subG,terminals)
+    nodeCategory=[nodeTable[c] for c in nodeCodes.tolist()]
+    edgeCategory=[edgeTable[c] for c in edgeCodes.tolist()]
+    return (nodeCategory, edgeCategory)
+
+
+NODE_CATEGORIES=('terminal','linker','other')
+SUBNET_EDGE_CATEGORIES=('subnetwork','other')
+EDGE_CATEGORIES=('terminal_terminal','terminal_linker','linker_linker')
+
+
+def determCatCodes(G, subG=None, terminals=[]):
+    '''
+    Determine the categories of nodes and edges as in determCat(), but return
+    compact codes instead of lists of names. 
+    Return a tuple (nodeCodes, edgeCodes, nodeTable, edgeTable). The codes are 
+    uint8 arrays in the order of G.nodes() and G.edges(), and table[code] is 
+    the category name. nodeTable is NODE_CATEGORIES, edgeTable is 
+    SUBNET_EDGE_CATEGORIES if subG is given and EDGE_CATEGORIES otherwise.
+    For CSRGraph, membership is computed with boolean masks over node ids.
+    '''
+    terminals=set(terminals)
+    if isinstance(G,CSRGraph):
+        return _catCodesCSR(G,subG,terminals)
+    n=G.order()
+    m=G.size()
     #if subG is not None, then we will collect node and edge categorization info 
     #for the global network.
-    if subG:  #
-        for node in G:
-            if node in terminals:
-                cat='terminal'
-            elif subG.has_node(node):
-                cat='linker'
-            else:
-                cat='other'
-            nodeCategory.append(cat)
-        for edge in G.edges():
-            gA,gB=edge
-            if subG.has_edge(gA,gB):
-                cat='subnetwork'
-            else:
-                cat='other'
-            edgeCategory.append(cat)
+    if subG:
+        nodeCodes=np.fromiter((0 if node in terminals else (1 if subG.has_node(node) else 2)
+                               for node in G),dtype=np.uint8,count=n)
+        edgeCodes=np.fromiter((0 if subG.has_edge(gA,gB) else 1
+                               for gA,gB in G.edges_iter()),dtype=np.uint8,count=m)
+        return (nodeCodes,edgeCodes,NODE_CATEGORIES,SUBNET_EDGE_CATEGORIES)
     #if subG is None, then G is probably the extracted subnetwork itself. Then we 
     #will collect node and edge categorization info for it. 
-    else:   #
-        for node in G:
-            if node in terminals:
-                cat='terminal'
-            else:
-                cat='linker'
-            nodeCategory.append(cat)
-        for edge in G.edges():
-            gA,gB=edge
-            tmp=set([gA,gB]) & terminals
-            if len(tmp)==2:
-                cat='terminal_terminal'
-            elif len(tmp)==1:
-                cat='terminal_linker'
-            else:
-                cat='linker_linker'
-            edgeCategory.append(cat)
-
-    return (nodeCategory, edgeCategory)
-            
-
+    nodeCodes=np.fromiter((0 if node in terminals else 1 for node in G),dtype=np.uint8,count=n)
+    edgeCodes=np.fromiter((2-(gA in terminals)-(gB in terminals and gB!=gA)
+                           for gA,gB in G.edges_iter()),dtype=np.uint8,count=m)
+    return (nodeCodes,edgeCodes,NODE_CATEGORIES,EDGE_CATEGORIES)
 
 
+def _node_mask(G,nodes):
+    mask=np.zeros(G.order(),dtype=bool)
+    mask[[G.index[node] for node in nodes if node in G.index]]=True
+    return mask
 
 
+def _catCodesCSR(G,subG,terminals):
+    n=G.order()
+    eu,ev=G.eu,G.ev
+    tmask=_node_mask(G,terminals)
+    if subG:
+        smask=_node_mask(G,subG.nodes())
+        nodeCodes=np.where(tmask,0,np.where(smask,1,2)).astype(np.uint8)
+        #edges of subG, keyed by G node ids
+        sub=[(G.index[u],G.index[v]) for u,v in subG.edges() if u in G.index and v in G.index]
+        su=np.array([u for u,v in sub],dtype=np.int64)
+        sv=np.array([v for u,v in sub],dtype=np.int64)
+        skeys=np.minimum(su,sv)*n+np.maximum(su,sv)
+        gkeys=np.minimum(eu,ev).astype(np.int64)*n+np.maximum(eu,ev)
+        edgeCodes=np.where(np.in1d(gkeys,skeys),0,1).astype(np.uint8)
+        return (nodeCodes,edgeCodes,NODE_CATEGORIES,SUBNET_EDGE_CATEGORIES)
+    nodeCodes=np.where(tmask,0,1).astype(np.uint8)
+    count=tmask[eu].astype(np.uint8)+(tmask[ev] & (eu!=ev))
+    edgeCodes=(2-count).astype(np.uint8)
+    return (nodeCodes,edgeCodes,NODE_CATEGORIES,EDGE_CATEGORIES)
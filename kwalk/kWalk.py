@@ -12,6 +12,13 @@ import time
 import numpy as np
 import math
 import os
+import shutil
+import tempfile
+import multiprocessing
+import ctypes
+import glob
+from scipy import sparse
+from scipy.sparse import linalg as splinalg
 
 #########################################################################
 
@@ -38,20 +45,633 @@ def match(seq,pool):
                     index[pos]=i
                     break
     return index
-                
 
-def kWalk(K,G,r=0.5):
+def transition_matrix(G,weight='weight',degree=False):
+    '''
+    Return (allnodes,index,Pm) of network G.
+    allnodes is the node list of G, index is a dict mapping a node to its
+    position in allnodes, and Pm is the row normalized transition matrix
+    in scipy.sparse CSR format, Pm[i,j]=w(i,j)/sum(w(i,:)).
+    Edge weight is taken from the weight attribute, 1 if missing, as
+    nx.linalg.spectrum.adj_matrix() does. G can be a nx.Graph or a gr_io.CSRGraph.
+    degree: if True, the weighted degree array is returned as the fourth element.
+    '''
+    allnodes=G.nodes()
+    n=len(allnodes)
+    if hasattr(G,'indptr'):    #CSRGraph, the adjacency is already there
+        index=G.index
+        indptr=G.indptr
+        indices=G.indices
+        if weight in G.edge_data:
+            data=np.asarray(G.edge_data[weight][G.eid],dtype=float)
+            data[np.isnan(data)]=1
+        else:
+            data=np.ones(len(indices))
+    else:
+        index=dict((node,i) for i,node in enumerate(allnodes))
+        indptr=np.zeros(n+1,dtype=np.int64)
+        indices=[]
+        data=[]
+        for i,node in enumerate(allnodes):
+            for nbr,d in G[node].items():
+                indices.append(index[nbr])
+                data.append(d.get(weight,1))
+            indptr[i+1]=len(indices)
+        indices=np.array(indices,dtype=np.int32)
+        data=np.array(data,dtype=float)
+    adjm=sparse.csr_matrix((data,indices,indptr),shape=(n,n))
+    adjm.sum_duplicates()
+    dgr=np.asarray(adjm.sum(axis=1)).ravel()
+    dgr[dgr==0]=1    #isolated node, its row stays zero
+    adjm.data/=np.repeat(dgr,np.diff(adjm.indptr))
+    if degree:
+        return (allnodes,index,adjm,dgr)
+    return (allnodes,index,adjm)
+
+BACKENDS=('auto','numpy','blas','sparse')
+
+def select_backend(Pm,backend='auto',dense_nodes=400,processes=1):
+    '''
+    Return the array backend that runs on the transition matrix Pm:
+    'numpy', Pm is a dense ndarray, with the default BLAS threading;
+    'blas', Pm is a dense ndarray, and the threads of the loaded BLAS
+    libraries are set to the cores of each process, see _blas_threads().
+    Outside a process pool that is all cores, it only overrides a thread
+    count limited by OPENBLAS_NUM_THREADS and the like. It is 'numpy' if no
+    BLAS thread count can be set, see _blas_libraries();
+    'sparse', Pm is a scipy.sparse CSR matrix.
+    'auto' is dense for networks of no more than dense_nodes nodes, where
+    the dense products beat the sparse ones on a single core, otherwise
+    'sparse'. See bench_backend.py. The dense backend is 'blas' when the
+    cores are shared by processes, the number of worker processes, or by
+    the workers of an outer pool, otherwise 'numpy'.
+    '''
+    if backend not in BACKENDS:
+        raise Exception('Unknown backend: %s' %backend)
+    if backend=='auto':
+        if Pm.shape[0] > dense_nodes:
+            backend='sparse'
+        elif processes > 1 or _cores is not None:
+            backend='blas'
+        else:
+            backend='numpy'
+    if backend=='blas' and not _blas_libraries():
+        backend='numpy'
+    return backend
+
+_BLAS_THREADS=[('openblas_set_num_threads','openblas_get_num_threads'),
+               ('MKL_Set_Num_Threads','MKL_Get_Max_Threads'),
+               ('bli_thread_set_num_threads','bli_thread_get_num_threads')]
+_blas=[]    #[(setter,getter),...] found by _blas_libraries()
+_cores=None    #cores of this process, set in the workers of a process pool
+
+def _blas_libraries():
+    '''
+    Return [(setter,getter),...] of the thread count of every loaded BLAS,
+    OpenBLAS, MKL or BLIS, through ctypes. numpy and scipy wheels each bundle
+    their own, the one of numpy, which runs the dense products, is first.
+    The libraries are looked up in the library directories of the numpy
+    wheel and in /proc/self/maps.
+    '''
+    if not _blas:
+        npdir=os.path.dirname(np.__file__)
+        paths=glob.glob(os.path.join(npdir,'.libs','*'))+glob.glob(os.path.join(npdir,'.dylibs','*'))
+        if os.path.exists('/proc/self/maps'):
+            for line in open('/proc/self/maps'):
+                path=line.split()[-1]
+                if path.startswith('/'):
+                    paths.append(path)
+        seen=set()
+        for path in paths:
+            name=os.path.basename(path).lower()
+            if 'blas' not in name and 'mkl' not in name and 'blis' not in name:
+                continue
+            try:
+                lib=ctypes.CDLL(path)
+            except OSError:
+                continue
+            for setter,getter in _BLAS_THREADS:
+                if hasattr(lib,setter) and hasattr(lib,getter):
+                    setter=getattr(lib,setter)
+                    addr=ctypes.cast(setter,ctypes.c_void_p).value    #wrappers like scipy's _fblas resolve to their BLAS
+                    if addr not in seen:
+                        seen.add(addr)
+                        _blas.append((setter,getattr(lib,getter)))
+                    break
+        if not _blas:
+            _blas.append(None)    #looked up, none found
+    return [blas for blas in _blas if blas is not None]
+
+def _set_blas_threads(n):
+    '''
+    Set the threads of every BLAS to n, or to n[i] for the i-th of
+    _blas_libraries(). Return the previous numbers to restore, None if no
+    BLAS is known.
+    '''
+    libs=_blas_libraries()
+    if not libs:
+        return None
+    if not isinstance(n,list):
+        n=[n]*len(libs)
+    previous=[]
+    for (setter,getter),threads in zip(libs,n):
+        previous.append(getter())
+        setter(int(threads))
+    return previous
+
+def _blas_threads(backend,processes=1):
+    '''
+    Share the cores of this process out among processes as BLAS threads if
+    backend is 'blas'. Return the previous number of threads, None if not
+    set.
+    '''
+    if backend!='blas':
+        return None
+    cores=_cores or multiprocessing.cpu_count()
+    return _set_blas_threads(max(1,cores//processes))
+
+def _init_cores(workers):
+    '''
+    Pool initializer, this process is one of workers sharing the cores of
+    the parent.
+    '''
+    global _cores
+    _cores=max(1,(_cores or multiprocessing.cpu_count())//workers)
+
+def absorbing_parts(Pm,index,NOI,CandN,Kprime):
+    '''
+    Return (Qx,Rx) for node of interest NOI.
+    Qx is the transition matrix among transient states [NOI]+CandN, the first
+    row is NOI. Rx is the transition matrix from the transient states to
+    the absorbing states Kprime. Both are CSR matrices.
+    '''
+    qidx=np.array([index[NOI]]+[index[x] for x in CandN],dtype=np.int64)
+    ridx=np.array([index[x] for x in Kprime],dtype=np.int64)
+    return _absorbing_parts(Pm,qidx,ridx)
+
+def _absorbing_parts(Pm,qidx,ridx):
+    rows=Pm[qidx,:]
+    return (rows[:,qidx],rows[:,ridx])
+
+def fundamental_row(Qx,solver='inv',dgr=None,tol=1e-10):
+    '''
+    Return the first row of the fundamental matrix N=(I-Qx)^-1, that is the
+    expected passage times of the transient states for a walk starting from
+    the first state.
+    solver: 'inv', dense inverse of I-Qx, O(n^3) and the whole N is computed;
+    'splu', sparse LU factorization of (I-Qx)^T;
+    'cg', conjugate gradient on the grounded Laplacian D_Q-A_QQ, which is
+    symmetric positive definite. N[0,:]=D_Q*y, where (D_Q-A_QQ)y=e0.
+    dgr, the weighted degrees of the transient states, is required;
+    'bicgstab' or 'gmres', iterative solvers on (I-Qx)^T.
+    tol: relative residual tolerance of the iterative solvers.
+    '''
+    n=Qx.shape[0]
+    if solver=='inv':
+        if sparse.issparse(Qx):
+            Qx=Qx.toarray()
+        N=np.linalg.inv(np.identity(n,dtype=Qx.dtype)-Qx)
+        return N[0,:]
+    e0=np.zeros(n,dtype=Qx.dtype)
+    e0[0]=1
+    if solver=='splu':
+        M=(sparse.identity(n,dtype=Qx.dtype,format='csr')-Qx).T.tocsc()
+        return splinalg.splu(M).solve(e0)
+    if solver=='cg':
+        if dgr is None:
+            raise Exception('cg solver needs the degrees of transient states')
+        D=sparse.diags(dgr)
+        Lg=(D-D.dot(Qx)).tocsr()    #D_Q-A_QQ
+        y,info=splinalg.cg(Lg,e0,tol=tol,M=sparse.diags(1.0/dgr))
+        x=dgr*y
+    elif solver in ('bicgstab','gmres'):
+        M=(sparse.identity(n,dtype=Qx.dtype,format='csr')-Qx).T.tocsr()
+        x,info=getattr(splinalg,solver)(M,e0,tol=tol)
+    else:
+        raise Exception('Unknown solver: %s' %solver)
+    if info!=0:
+        raise Exception('%s solver did not converge, info %d' %(solver,info))
+    return x
+
+def seed_rows(Pm,xidx,cidx):
+    '''
+    Return the first rows of the fundamental matrices of several nodes of
+    interest, a (len(xidx),len(cidx)+1) array. Row i is N[x,x] followed by
+    N[x,C] for x=xidx[i], where the transient states are x and the candidate
+    nodes C=cidx (positions in Pm).
+    The transient states of different x share C, so B=I-P_CC is factored once
+    and each row is derived from the Schur complement of B:
+    u=B^-T p_xC, s=1-p_xx-u.P_Cx, N[x,x]=1/s and N[x,C]=u/s.
+    '''
+    xidx=np.asarray(xidx,dtype=np.int64)
+    cidx=np.asarray(cidx,dtype=np.int64)
+    Pcc=Pm[cidx,:][:,cidx]
+    B=sparse.identity(len(cidx),format='csr')-Pcc
+    lu=splinalg.splu(B.T.tocsc())
+    PxC=Pm[xidx,:][:,cidx].toarray()
+    PCx=Pm[cidx,:][:,xidx].toarray()
+    pxx=Pm[xidx,:][:,xidx].diagonal()
+    U=lu.solve(PxC.T)    #column i is u of xidx[i]
+    if U.ndim==1:
+        U=U.reshape(-1,1)
+    s=1-pxx-(U*PCx).sum(axis=0)
+    rows=np.empty((len(xidx),len(cidx)+1))
+    rows[:,0]=1
+    rows[:,1:]=U.T
+    return rows/s[:,np.newaxis]
+
+def edge_passage(Lalpha,Qx,Lbeta,scales=None):
+    '''
+    Return the expected passage times of the edges between transient states,
+    edgeM[i,j]=sum(Lalpha[i,]*Qx[i,j]*Lbeta[j,])/B, B=Lbeta[0,-1], computed
+    as Qx*(Lalpha.Lbeta^T)/B. All zero if B is 0.
+    Lalpha: forward lattice of the transient states, (n-k+1)*L;
+    Qx: transition matrix of the transient states, sparse or dense;
+    Lbeta: backward lattice, (n-k+1)*L.
+    scales: (ascale,bscale), the log column scales of log-scaled lattices,
+    see noi_lattices(). The true passage times of a long walk may overflow,
+    so they are returned up to a constant factor, B is left out and the
+    largest column weight is 1. The threshold selection of limkWalks doesn't
+    depend on the factor.
+    '''
+    m=Lbeta.shape[0]
+    B=Lbeta[0,-1]
+    if B==0:
+        return np.zeros((m,m),dtype=Lbeta.dtype)
+    if sparse.issparse(Qx):
+        Qx=Qx.toarray()
+    if scales is None:
+        edgeM=np.dot(Lalpha[:m,],Lbeta.T)
+        edgeM*=Qx
+        edgeM/=B
+    else:
+        edgeM=np.dot(Lalpha[:m,]*_scale_weights(scales),Lbeta.T)
+        edgeM*=Qx
+    return edgeM
+
+def _scale_weights(scales):
+    '''
+    Column weights exp(ascale+bscale) of log-scaled lattices, divided by
+    their maximum.
+    '''
+    s=scales[0]+scales[1]
+    return np.exp(s-s.max())
+
+def edge_passage_sparse(Lalpha,Qx,Lbeta,chunksize=1<<18,scales=None):
+    '''
+    Return the expected passage times of edge_passage() on the nonzero entries
+    of Qx only, as a scipy.sparse COO matrix. Entries off the edges of Qx are
+    zero anyway, so memory is O(m) instead of O((n-k+1)^2).
+    The entries are computed chunksize at a time.
+    scales: log column scales, see edge_passage().
+    '''
+    m=Lbeta.shape[0]
+    coo=sparse.coo_matrix(Qx)
+    B=Lbeta[0,-1]
+    vals=np.zeros(coo.nnz,dtype=Lbeta.dtype)
+    if B!=0:
+        if scales is not None:
+            Lalpha=Lalpha*_scale_weights(scales)
+            B=1
+        for s in xrange(0,coo.nnz,chunksize):
+            row=coo.row[s:s+chunksize]
+            col=coo.col[s:s+chunksize]
+            block=np.einsum('ij,ij->i',Lalpha[row],Lbeta[col])
+            block*=coo.data[s:s+chunksize]
+            block/=B
+            vals[s:s+chunksize]=block
+    return sparse.coo_matrix((vals,(coo.row,coo.col)),shape=(m,m))
+
+def edge_passage_ref(Lalpha,Qx,Lbeta):
+    '''
+    Straightforward implementation of edge_passage(). For ref only.
+    '''
+    if sparse.issparse(Qx):
+        Qx=Qx.toarray()
+    m=Lbeta.shape[0]
+    L=Lbeta.shape[1]
+    edgeM=np.zeros((m,m))
+    for i in range(m):
+        stack=[0]*m
+        for j in range(m):
+            B=Lbeta[0,L-1]
+            if B==0:
+                stack[j]=0
+                continue
+            A=sum(Lalpha[i,]*Qx[i,j]*Lbeta[j,])
+            stack[j]=A/B
+        edgeM[i,]=stack
+    return edgeM
+
+def select_theta(row,col,val,m):
+    '''
+    Automatic edge weight threshold selection of limkWalks.
+    Return (theta,nodes), theta is the maximal row maximum of the expected
+    passage times that induces a connected subgraph from the edges with
+    passage time >= theta, nodes is the node set of that subgraph.
+    If no such theta, the subgraph of the smallest positive theta is returned.
+    If no positive passage time at all, theta is 0 and nodes is empty.
+    row,col,val: the nonzero entries of the edge passage time matrix, m*m.
+    The edges are sorted once and merged by union-find, so connectivity of
+    every candidate theta is known in one pass.
+    '''
+    row=np.asarray(row)
+    col=np.asarray(col)
+    val=np.asarray(val,dtype=float)
+    pos=val>0
+    row,col,val=row[pos],col[pos],val[pos]
+    if len(val)==0:
+        return (0,set())
+    rowmax=np.zeros(m)
+    np.maximum.at(rowmax,row,val)
+    cands=set(rowmax[rowmax>0].tolist())
+    thmin=min(cands)
+    order=np.argsort(-val,kind='mergesort')
+    row=row[order].tolist()
+    col=col[order].tolist()
+    val=val[order].tolist()
+
+    parent=range(m)
+    def find(x):
+        while parent[x]!=x:
+            parent[x]=parent[parent[x]]
+            x=parent[x]
+        return x
+    nodes=set()
+    comps=0
+    theta=thmin
+    for t in xrange(len(val)):
+        if val[t] < thmin:
+            break
+        u=row[t]
+        v=col[t]
+        for x in (u,v):
+            if x not in nodes:
+                nodes.add(x)
+                comps+=1
+        ru=find(u)
+        rv=find(v)
+        if ru!=rv:
+            parent[ru]=rv
+            comps-=1
+        if t+1==len(val) or val[t+1]!=val[t]:    #all edges >= val[t] are in
+            if comps==1 and val[t] in cands:
+                theta=val[t]
+                break
+    return (theta,nodes)
+
+def select_theta_ref(edgeM):
+    '''
+    Straightforward implementation of select_theta() on a dense matrix,
+    a connected graph is built for every candidate theta. For ref only.
+    '''
+    thset=np.apply_along_axis(max,1,edgeM)
+    thset=list(set(thset))
+    thset.sort(reverse=True)
+    theta=0
+    tmpg2=nx.Graph()
+    for th in thset:
+        if th<=0:
+            break
+        theta=th
+        tmpM=edgeM.copy()
+        tmpM[tmpM < theta]=0
+        tmpM[tmpM >= theta]=1
+        tmpg=nx.convert.from_numpy_matrix(tmpM)
+        tmpg2=nx.convert.from_edgelist(tmpg.edges())
+        if nx.components.connected.is_connected(tmpg2):
+            break
+    return (theta,set(tmpg2.nodes()))
+
+def noi_lattices(Qx,Rx,L,logscale=False,eps=None):
+    '''
+    Return the lattices (Lalpha_part1,Lalpha_part2,Lbeta) of limkWalks for one
+    node of interest, the first transient state of Qx.
+    Qx: transition matrix of the transient states;
+    Rx: transition matrix from the transient states to the absorbing states;
+    L: the maximal walk length.
+    The lattices have the dtype of Qx. If logscale is True, each column is
+    divided by its maximum so that long walks don't underflow, and the log
+    column scales (ascale,bscale) are appended to the returned tuple. The
+    true lattices are Lalpha*exp(ascale) and Lbeta*exp(bscale).
+    eps: if given, the walk stops at the first step whose transient mass,
+    the sum of the Lalpha_part1 column, is below eps, and the lattices have
+    that many columns only, see _absorbed().
+    '''
+    ###############################################################################
+    ##the row names of Lalpha part1 and part2 are Qlabels and Kprime respectively.
+    #this matrix is the probability (i,l) of starting the walk in x and
+    #reaching state i in l steps.
+    #the basis probability
+    Lalpha_part1=np.zeros((Rx.shape[0],L),dtype=Qx.dtype)   #for the transient state
+    Lalpha_part2=np.zeros((Rx.shape[1],L),dtype=Qx.dtype)     #for the absorbing state
+    Lalpha_part1[0,0]=1
+    ascale=np.zeros(L)
+    bscale=np.zeros(L)
+
+    for l in range(1,L):
+        vec_part1=Qx.T.dot(Lalpha_part1[:,l-1])
+        vec_part2=Rx.T.dot(Lalpha_part1[:,l-1])
+        if logscale:
+            c=_col_scale(vec_part1)
+            vec_part1/=c
+            vec_part2/=c
+            ascale[l]=ascale[l-1]+np.log(c)
+        Lalpha_part1[:,l]=vec_part1
+        Lalpha_part2[:,l]=vec_part2
+        if eps is not None and _absorbed(vec_part1.sum(),eps,ascale[l]):
+            L=l+1
+            break
+    Lalpha_part1=Lalpha_part1[:,:L]
+    Lalpha_part2=Lalpha_part2[:,:L]
+    ascale=ascale[:L]
+    bscale=bscale[:L]
+
+    #the following code is a straight implementation, just for confirmation purpose
+    #for l in range(1,L):
+    #    Lalpha_part1[:,l]=matrix_power(Qx,l)[0,:]
+    #    Lalpha_part2[:,l]=np.dot(matrix_power(Qx,l-1),Rx)[0,:]
+
+    ################################################################################
+    ##the beta lattice. Row names are NOI + Candinate nodes.
+    #I compared the results, they are identical with the straightforward
+    #implementation.
+    #
+    Lbeta=np.zeros((Rx.shape[0],L),dtype=Qx.dtype)
+    Lbeta[:,0]=0    #when sl=L-1, the basis of Beta lattice
+
+    for sl in range((L-1)-1,-1,-1):
+        if sl==(L-1)-1:
+            #print np.apply_along_axis(sum, 1, np.nan_to_num(Rx))
+            vec_b = np.asarray(Rx.sum(axis=1)).ravel()
+        else:
+            vec_b=Qx.dot(Lbeta[:,(L-1)-sl-1])
+        if logscale:
+            c=_col_scale(vec_b)
+            vec_b/=c
+            bscale[(L-1)-sl]=bscale[(L-1)-sl-1]+np.log(c)
+        Lbeta[:,(L-1)-sl]=vec_b
+    
+    #the following code is a straight implementation, just for confirmation purpose
+    #for sl in range((L-1)-1,-1,-1):
+    #    print (L-1)-sl,sl
+    #    tmp=np.dot(matrix_power(Qx,(L-1)-sl-1),Rx)
+    #    vec=np.apply_along_axis(sum,1,tmp)
+    #    Lbeta[:,(L-1)-sl]=vec
+    if logscale:
+        return (Lalpha_part1,Lalpha_part2,Lbeta,ascale,bscale)
+    return (Lalpha_part1,Lalpha_part2,Lbeta)
+
+def _col_scale(X):
+    '''
+    Column maxima of X (a vector or a matrix), 1 for a zero column.
+    '''
+    c=X.max(axis=0)
+    return np.where(c>0,c,1)
+
+def _absorbed(mass,eps,ascale=0):
+    '''
+    True where the transient mass of an alpha lattice column, mass*exp(ascale)
+    for a log-scaled column, is below eps. The mass never grows along the
+    walk, so every later step is below eps too, and the terms of the later
+    steps add less than (L-l)*eps to a passage time before it is divided by
+    B.
+    '''
+    with np.errstate(divide='ignore'):
+        return np.log(mass)+ascale < np.log(eps)
+
+def seed_lattices(Pm,xidx,L,logscale=False,eps=None):
+    '''
+    Return the lattices (alpha,beta) of limkWalks for all nodes of interest
+    at once, both are (L,n,k) arrays indexed by the positions in Pm.
+    For the node of interest x=xidx[j], the transient states are x and all
+    non-seed nodes, the other seeds are absorbing. alpha[:,:,j].T is
+    Lalpha_part1 and beta[:,:,j].T is Lbeta of x, with zero rows at the
+    other seeds.
+    The recurrences of all seeds are run together on the full transition
+    matrix, a sparse-dense matrix product per step, and the other seeds are
+    masked out after each step. The absorbing part of Lalpha is not needed
+    for the passage times, and is not computed.
+    The lattices have the dtype of Pm. If logscale is True, each column is
+    scaled as in noi_lattices(), and the log scales (ascale,bscale), (L,k)
+    arrays, are appended to the returned tuple.
+    eps: if given, the walks stop once the transient mass of every seed is
+    below eps, see noi_lattices(). The lattices are cut to the longest walk,
+    the shorter ones are found again by _absorbed().
+    '''
+    n=Pm.shape[0]
+    xidx=np.asarray(xidx,dtype=np.int64)
+    k=len(xidx)
+    cols=np.arange(k)
+    mask=np.ones((n,k),dtype=Pm.dtype)    #transient states of each seed
+    mask[xidx,:]=0
+    mask[xidx,cols]=1
+    PmT=Pm.T.tocsr() if sparse.issparse(Pm) else Pm.T
+    alpha=np.zeros((L,n,k),dtype=Pm.dtype)
+    ascale=np.zeros((L,k))
+    bscale=np.zeros((L,k))
+
+    A=np.zeros((n,k),dtype=Pm.dtype)
+    A[xidx,cols]=1
+    alpha[0]=A
+    for l in range(1,L):
+        A=PmT.dot(A)
+        A*=mask
+        if logscale:
+            c=_col_scale(A)
+            A/=c
+            ascale[l]=ascale[l-1]+np.log(c)
+        alpha[l]=A
+        if eps is not None and _absorbed(A.sum(axis=0),eps,ascale[l]).all():
+            L=l+1
+            break
+    alpha=alpha[:L]
+    ascale=ascale[:L]
+    bscale=bscale[:L]
+
+    beta=np.zeros((L,n,k),dtype=Pm.dtype)
+    if L>1:
+        Px=Pm[:,xidx]
+        if sparse.issparse(Px):
+            Px=Px.toarray()
+        b=np.zeros((n,k),dtype=Pm.dtype)
+        for j in range(k):    #transition probability to the other seeds
+            b[:,j]=np.delete(Px,j,axis=1).sum(axis=1)
+        for l in range(1,L):
+            if l>1:
+                b=Pm.dot(b)
+            b*=mask
+            if logscale:
+                c=_col_scale(b)
+                b/=c
+                bscale[l]=bscale[l-1]+np.log(c)
+            beta[l]=b
+    if logscale:
+        return (alpha,beta,ascale,bscale)
+    return (alpha,beta)
+
+def _select_row(scoreVec,r,tie=0):
+    '''
+    Return the positions (the first excluded) selected from a row of the
+    fundamental matrix. The nodes with the highest expected passage time are
+    selected. The nodes with the second highest are also selected if the
+    first state has the highest and they reach r of it.
+    tie: scores differ no more than tie*max(scoreVec) are taken as equal.
+    '''
+    scoreVec=np.asarray(scoreVec)
+    scores=np.unique(scoreVec)[::-1]
+    eps=tie*abs(scores[0])
+    if eps>0:    #merge the near-equal scores
+        keep=[scores[0]]
+        for x in scores[1:]:
+            if keep[-1]-x > eps:
+                keep.append(x)
+        scores=keep
+    w1=scores[0]
+    w2=scores[1] if len(scores)>1 else w1
+    close=lambda a,b: abs(a-b)<=eps
+
+    flag=close(scoreVec[0],w1)
+    select=[]
+    for i in range(1,len(scoreVec)):
+        if close(scoreVec[i],w1):
+            select.append(i)
+        elif close(scoreVec[i],w2):
+            if flag and scoreVec[i]*(1.0/r) >= w1-eps:
+                select.append(i)
+    return select
+
+
+def kWalk(K,G,r=0.5,solver='inv',tol=1e-10,processes=1,precision='float64',tie_tol=None,
+          backend='auto'):
     '''
     Straightfoward implementation of the k walks algorithm, proposed
     by P. Dupont et al in 2006.
     K, the set of seed nodes;
-    G, the global network. Order should no bigger than 1000;
+    G, the global network. Order should no bigger than 1000 with the
+    default solver;
     r, a inclusion parameter, the proportion of the expected passage
     time of a node Vt to that of the node of interest x. The rationale is,
     if the expected passage number of x is much bigger than other candidate
     nodes, it is reasonable to keep the walk to x. Otherwise, if the possibility
     to other node is bigger than M*r, this node will be included. M is
     the expected passage time of x. 
+    solver, how the row of the fundamental matrix is computed, see
+    fundamental_row(). 'splu' or 'cg' work for networks of 10k-50k nodes.
+    'schur' factors the candidate block once for all seeds, see seed_rows(),
+    it is the fastest when there are many seeds.
+    tol, tolerance of the iterative solvers.
+    processes, number of worker processes for the nodes of interest, None
+    for all cores. The transition matrix is shared with the workers through
+    memory-mapped files, see _run_shared(). Not used by 'schur'.
+    precision, 'float64' or 'float32', the dtype of the transition and
+    fundamental matrices.
+    tie_tol, scores differ no more than a relative tie_tol are taken as equal.
+    By default it is 1e-9, 100*tol for the iterative solvers, and 1e-5 at
+    least for float32. 0 compares the scores exactly.
+    backend, the array backend, see select_backend(). The dense backends
+    work with the 'inv' solver only, 'auto' is 'sparse' for the others. The
+    backend used is reported in subG.graph['backend'].
     '''
     if r==0:
         r=0.001
@@ -59,61 +679,141 @@ def kWalk(K,G,r=0.5):
         raise Exception('G must be connected!')
     if (len(K)<2):
         raise Exception('There must be more than two seed nodes!')
-    allnodes=G.nodes()
-    adjm=nx.linalg.spectrum.adj_matrix(G)
-    dgr=np.apply_along_axis(sum,0,adjm)
-    Pm=(adjm/dgr).transpose()    #initial transition matrix
+    if precision not in ('float64','float32'):
+        raise Exception('Unknown precision for kWalk: %s' %precision)
+    if processes is None:
+        processes=multiprocessing.cpu_count()
+    allnodes,pos,Pm,dgr=transition_matrix(G,degree=True)    #initial transition matrix
+    Pm=Pm.astype(precision)
+    dgr=dgr.astype(precision)
+    if solver!='inv' and backend!='sparse':    #the other solvers factor sparse matrices
+        if backend!='auto':
+            raise Exception('The %s solver needs the sparse backend' %solver)
+        backend='sparse'
+    backend=select_backend(Pm,backend,processes=processes)
+    if backend!='sparse':
+        Pm=Pm.toarray()
     collect=set()
-    
-    for NOI in K:
-        select=set()
-        Kprime=list(set(K)-set([NOI]))
-        CandN=list(set(allnodes) - set(K))
-        Qlabels=[NOI]+CandN    ##the first element in Qlabels would be NOI
-
-        index=match(Qlabels, allnodes)
-        Qx=Pm[index,:][:,index]    #the first row is NOI, then the candidate genes
-        index2=match(Kprime,allnodes)
-        Rx=Pm[index,:][:,index2]
-        #print Qx
-        #print Qlabels
-
-        I=np.identity(Qx.shape[0])
-
-        N=np.linalg.inv(I-Qx)
-        #print NOI
-        #print Qlabels
-        #print N.round(2)
-
-        tmpN=N.copy()[0,:]
-        scoreVec=tmpN.tolist()[0]
-        scores=list(set(scoreVec))
-        scores.sort(reverse=True)
-        w1=scores[0]
-        w2=scores[1]
-
-        flag=0
-        if scoreVec[0]==scores[0]:
-            flag=1
-        for i in range(1,tmpN.shape[1]):
-            node=Qlabels[i]
-            if scoreVec[i]==w1:
-                select.add(node)
-            if scoreVec[i]==w2:
-                if flag and scoreVec[i]*(1.0/r) >= w1:
-                    select.add(node)
-
-        collect=collect.union(select)
-        #print I-Qx
-        #print Qlabels
-        #print N
-        #print select
-        #print '\n\n'
+    CandN=list(set(allnodes) - set(K))
+    cidx=np.array([pos[x] for x in CandN],dtype=np.int64)
+    tie=tie_tol
+    if tie is None:
+        tie=1e-9 if solver in ('inv','splu','schur') else max(100*tol,1e-9)
+        if precision=='float32':
+            tie=max(tie,1e-5)
+    xidx=[pos[NOI] for NOI in K]
+
+    if solver=='schur':
+        rows=seed_rows(Pm,xidx,cidx)
+        results=[]
+        for j,xi in enumerate(xidx):
+            qidx=np.concatenate(([xi],cidx))
+            results.append(qidx[_select_row(rows[j],r,tie)])
+    elif processes > 1 and len(xidx) > 1:
+        tasks=[(xi,r,solver,tol,tie) for xi in xidx]
+        results=_run_shared(_kwalk_task,tasks,processes,backend,Pm=Pm,dgr=dgr,cidx=cidx)
+    else:
+        threads=_blas_threads(backend)
+        try:
+            results=[_kwalk_noi(Pm,dgr,xi,cidx,r,solver,tol,tie) for xi in xidx]
+        finally:
+            if threads is not None:
+                _set_blas_threads(threads)
+
+    for select in results:
+        collect=collect.union([allnodes[i] for i in select])
     finalset=collect.union(K)
     subG=nx.subgraph(G,finalset)
+    subG.graph=dict(subG.graph)    #the subgraph shares G.graph
+    subG.graph['backend']=backend
     return subG
 
 
+def _kwalk_noi(Pm,dgr,xi,cidx,r,solver,tol,tie):
+    '''
+    kWalk for one node of interest, Pm position xi, with candidate nodes cidx.
+    Return the Pm positions of the selected nodes.
+    '''
+    qidx=np.concatenate(([xi],cidx))    ##the first element would be NOI
+    Qx=Pm[qidx,:][:,qidx]    #the first row is NOI, then the candidate genes
+    scoreVec=fundamental_row(Qx,solver,dgr[qidx],tol)
+    #print scoreVec.round(2)
+    return qidx[_select_row(scoreVec,r,tie)]
+
+
+def _kwalk_task(task):
+    xi,r,solver,tol,tie=task
+    return _kwalk_noi(_shared['Pm'],_shared['dgr'],xi,_shared['cidx'],r,solver,tol,tie)
+
+
+_shared={}    #arrays published by _run_shared(), in a worker process
+
+def _run_shared(func,tasks,processes,backend=None,**arrays):
+    '''
+    Run func over tasks with a process pool, return the results in task order.
+    The arrays are written once to a temporary directory as .npy files (a
+    sparse matrix by its CSR arrays), and each worker maps them read-only
+    into _shared when it starts, so they are not pickled with the tasks.
+    backend: the BLAS threads of the workers are set for it, see
+    _blas_threads().
+    '''
+    dirname=tempfile.mkdtemp(prefix='kwalk_')
+    try:
+        _save_arrays(dirname,arrays)
+        workers=min(processes,len(tasks))
+        pool=multiprocessing.Pool(workers,_init_shared,(dirname,backend,workers))
+        try:
+            results=pool.map(func,tasks,1)
+        finally:
+            pool.close()
+            pool.join()
+    finally:
+        shutil.rmtree(dirname,ignore_errors=True)
+    return results
+
+
+def _init_shared(dirname,backend=None,workers=1):
+    _shared.clear()
+    _shared.update(_load_arrays(dirname))
+    _init_cores(workers)
+    _blas_threads(backend)    #for the life of the worker
+
+
+def _save_arrays(dirname,arrays):
+    '''
+    Save a dict of arrays to dirname as .npy files, a sparse matrix by its
+    CSR arrays.
+    '''
+    for name,a in arrays.items():
+        if sparse.issparse(a):
+            a=a.tocsr()
+            for part in ('data','indices','indptr'):
+                np.save(os.path.join(dirname,'%s.%s.npy' %(name,part)),getattr(a,part))
+            np.save(os.path.join(dirname,'%s.shape.npy' %name),np.array(a.shape))
+        else:
+            np.save(os.path.join(dirname,'%s.npy' %name),np.asarray(a))
+
+
+def _load_arrays(dirname):
+    '''
+    Return a dict of the arrays saved by _save_arrays(), memory-mapped
+    read-only.
+    '''
+    arrays={}
+    parts={}
+    for fname in os.listdir(dirname):
+        name=fname.split('.')
+        a=np.load(os.path.join(dirname,fname),mmap_mode='r')
+        if len(name)==2:
+            arrays[name[0]]=a
+        else:
+            parts.setdefault(name[0],{})[name[1]]=a
+    for name,p in parts.items():
+        arrays[name]=sparse.csr_matrix((p['data'],p['indices'],p['indptr']),
+                                       shape=tuple(p['shape']),copy=False)
+    return arrays
+
+
 #G=nx.components.strongly_connected_component_subgraphs(G)[0]
 #K=['a','f']
 #a=kWalk(K,G)
@@ -122,159 +822,313 @@ def kWalk(K,G,r=0.5):
 #limited k walks
 #G=nx.components.connected_component_subgraphs(G)[0]
 
-def limkWalks(K,G,L=50,iteration=1):
+def limkWalks(K,G,L=50,iteration=1,sparse_edges=False,batch=False,processes=1,precision='float64',
+              workdir=None,memory=1<<28,eps=None,backend='auto'):
     '''
     The limited k-walk algorithm, proposed
     by P. Dupont et al in 2006. This function is for connected network only.
     Otherwise, call limkSearch(). 
+    sparse_edges: if True, the expected passage times are only computed and
+    stored for the edges of G (see edge_passage_sparse()), instead of a dense
+    (n-k+1)*(n-k+1) matrix. Use it for large networks.
+    batch: if True, the lattices of all seeds are computed together by
+    seed_lattices(), it takes k*n*L*16 bytes.
+    processes: number of worker processes for the nodes of interest, None
+    for all cores. The transition matrix is shared with the workers through
+    memory-mapped files, see _run_shared(). batch is not used with workers.
+    precision: 'float64', 'float32' to halve the memory of the lattices and
+    edge passage times, or 'log' for long walks, the lattice columns are
+    rescaled every step so they don't underflow, see noi_lattices().
+    workdir: if given, run out of core, see _limk_noi_ooc(). The transition
+    matrix and the lattices are memory-mapped files in a temporary directory
+    under workdir, and the edge passage times are computed in blocks of about
+    memory bytes. Memory use is O(n+m) instead of O(n*L+n^2). The nodes of
+    interest are run one by one, batch and processes are not used.
+    eps: if given, the walk of each node of interest stops early, at the
+    first step whose transient mass in Lalpha is below eps. Its result is that
+    of L set to this effective length, and the steps left out would add less
+    than (L-effective L)*eps to each unnormalised passage time, see
+    _absorbed(). The effective length of each node of interest is reported in
+    subg.graph['effective_L'], a dict, L for all of them if eps is None.
+    backend: the array backend, see select_backend(), reported in
+    subg.graph['backend']. The out-of-core mode needs 'sparse', it is taken
+    for 'auto'.
     '''
     if not nx.components.connected.is_connected(G):
         raise Exception ('G has to be connected!')
+    if precision not in ('float64','float32','log'):
+        raise Exception('Unknown precision: %s' %precision)
+    if processes is None:
+        processes=multiprocessing.cpu_count()
+    logscale=precision=='log'
     #iteration=1
-    allnodes=G.nodes()
     #L=10
+    allnodes,pos,Pm,dgr=transition_matrix(G,degree=True)    #initial transition matrix, this will use 'edge weight' attribute.
+    if precision=='float32':
+        Pm=Pm.astype(np.float32)
+        dgr=dgr.astype(np.float32)
     n=len(allnodes)
-    adjm = nx.linalg.spectrum.adj_matrix(G)  
+    if workdir is not None and backend!='sparse':    #out of core runs on the CSR arrays
+        if backend!='auto':
+            raise Exception('workdir needs the sparse backend')
+        backend='sparse'
+    backend=select_backend(Pm,backend,processes=processes)
+    if backend!='sparse':
+        Pm=Pm.toarray()
 
-
-      #this will use 'edge weight' attribute.
-    dgr=np.apply_along_axis(sum, 0,adjm)
-    Pm=(adjm/dgr).transpose()    #initial transition matrix
+    tmpdir=None
+    if workdir is not None:    #keep the transition matrix on disk
+        tmpdir=tempfile.mkdtemp(prefix='limk_',dir=workdir)
+        _save_arrays(tmpdir,{'Pm':Pm,'dgr':dgr})
+        shared=_load_arrays(tmpdir)
+        Pm=shared['Pm']
+        dgr=shared['dgr']
 
     collect=set(K)
+    effective={}
 
-    for iter_i in range(iteration):
-
-        K=set(K)
-        k=len(K)
-        #print 'iter',iter_i,K
-        for NOI in K:
-
-            selected=NOI
-            Kprime=list(K-set([NOI]))
-            CandN=list(set(allnodes) - K)
-            Qlabels=[NOI]+CandN    ##the first element in Qlabels would be NOI
-                                   #Qlabels represents the transient states
-
-            index=match(Qlabels, allnodes)
-            Qx=Pm[index,:][:,index]    #the first row is NOI, then the candidate genes
-            index2=match(Kprime,allnodes)
-            Rx=Pm[index,:][:,index2]
-
-            selected=NOI
-            
-            ##build two lattices, Lalpha and Lbeta
-
-            ###############################################################################
-            ##the row names of Lalpha part1 and part2 are Qlabels and Kprime respectively.
-            #this matrix is the probability (i,l) of starting the walk in x and
-            #reaching state i in l steps.
-            #the basis probability
-            Lalpha_part1=np.zeros((n-k+1,L))   #for the transient state
-            Lalpha_part2=np.zeros((k-1,L))     #for the absorbing state
-            Lalpha_part1[0,0]=1
-
-            for l in range(1,L):
-                vec_part1=np.dot(Lalpha_part1[:,l-1],Qx)
-                Lalpha_part1[:,l]=vec_part1
-                vec_part2=np.dot(Lalpha_part1[:,l-1],Rx)
-                Lalpha_part2[:,l]=vec_part2
-
-            Lalpha=np.vstack((Lalpha_part1,Lalpha_part2))
-
-            #the following code is a straight implementation, just for confirmation purpose
-            #for l in range(1,L):
-            #    Lalpha_part1[:,l]=matrix_power(Qx,l)[0,:]
-            #    Lalpha_part2[:,l]=np.dot(matrix_power(Qx,l-1),Rx)[0,:]
-
-            ################################################################################
-            ##the beta lattice. Row names are NOI + Candinate nodes.
-            #I compared the results, they are identical with the straightforward
-            #implementation.
-            #
-            Lbeta=np.zeros((n-k+1,L))
-            Lbeta[:,0]=0    #when sl=L-1, the basis of Beta lattice
-
-            for sl in range((L-1)-1,-1,-1):
-                if sl==(L-1)-1:
-                    #print np.apply_along_axis(sum, 1, np.nan_to_num(Rx))
-                    cur_sum = np.nan_to_num(Rx).sum(axis=1)
-                    cur_sum = np.array(cur_sum)
-                    Lbeta[:,(L-1)-sl] = cur_sum.T[0]
-                    continue
-                else:
-                    vec_b=np.dot(Qx,Lbeta[:,(L-1)-sl-1])
-                    Lbeta[:,(L-1)-sl]=vec_b
-            
-            #the following code is a straight implementation, just for confirmation purpose
-            #for sl in range((L-1)-1,-1,-1):
-            #    print (L-1)-sl,sl
-            #    tmp=np.dot(matrix_power(Qx,(L-1)-sl-1),Rx)
-            #    vec=np.apply_along_axis(sum,1,tmp)
-            #    Lbeta[:,(L-1)-sl]=vec
-            
-            ################################################################################
-            ##calculate the expected passage times for each edge.
-            #actually, we don't have to calculate all the edges
-
-            edgeM=np.zeros((n-k+1,n-k+1))    ###expected passage times for edges between transient states
-            for i in range(n-k+1):
-                stack=[0]*(n-k+1)
-                for j in range(n-k+1):
-                    B=Lbeta[0,L-1]
-                    if B==0:
-                        stack[j]=0
-                        continue
-                    #if j < n-k+1:
-                    A=sum(Lalpha[i,]*Qx[i,j]*Lbeta[j,])
-                    stack[j]=A/B
-                        #print 'transient',i,j
-                    #else:
-                    #    A=Lalpha[i,L-1]*Rx[i,j-(n-k+1)]
-                    #    stack[j]=A/B
-                        #print 'absorbing',i,j
-                edgeM[i,]=stack
-
-            ##automatic edge weight threshold selection
-            #maximal theta to induce a connected subgraph from edges
-            thset=np.apply_along_axis(max,1,edgeM)
-            thset=list(set(thset))
-            thset.sort(reverse=True)
-            for theta in thset:
-                if theta==0:
-                    break
-                else:
-                    tmpM=edgeM.copy()
-                    tmpM[tmpM < theta]=0
-                    tmpM[tmpM >= theta]=1
-                    tmpg=nx.convert.from_numpy_matrix(tmpM)
-                    tmpg2=nx.convert.from_edgelist(tmpg.edges())
-                    if nx.components.connected.is_connected(tmpg2):
-                        break
-                    else:
-                        continue
-
-            collect=collect.union(set([Qlabels[x] for x in tmpg2.nodes()]))
-        K=collect    #for iteration purpose.
+    threads=_blas_threads(backend)
+    try:
+        for iter_i in range(iteration):
+
+            K=set(K)
+            k=len(K)
+            CandN=list(set(allnodes) - K)    #candidate nodes are shared by all NOIs
+            cidx=np.array([pos[x] for x in CandN],dtype=np.int64)
+            #print 'iter',iter_i,K
+            tasks=[(pos[NOI],[pos[x] for x in K-set([NOI])],L,sparse_edges,logscale,eps) for NOI in K]
+
+            if tmpdir is not None:
+                results=[_limk_noi_ooc(Pm,dgr,task[0],task[1],L,tmpdir,memory,logscale,eps) for task in tasks]
+            elif processes > 1 and k > 1:
+                results=_run_shared(_limk_task,tasks,processes,backend,Pm=Pm,cidx=cidx)
+            elif batch:
+                lattices=seed_lattices(Pm,[task[0] for task in tasks],L,logscale,eps)
+                lengths=np.repeat(lattices[0].shape[0],k)
+                if eps is not None:    #walk length of each seed
+                    short=_absorbed(lattices[0].sum(axis=1),eps,lattices[2] if logscale else 0)
+                    lengths=np.where(short.any(axis=0),short.argmax(axis=0)+1,lengths)
+                results=[]
+                for j,task in enumerate(tasks):
+                    qidx=np.concatenate(([task[0]],cidx))
+                    l=lengths[j]
+                    noi=(lattices[0][:l,qidx,j].T,lattices[1][:l,qidx,j].T)
+                    noi+=tuple(scale[:l,j] for scale in lattices[2:])
+                    results.append(_limk_noi(Pm,task[0],task[1],cidx,L,sparse_edges,noi))
+            else:
+                results=[_limk_noi(Pm,task[0],task[1],cidx,L,sparse_edges,None,logscale,eps) for task in tasks]
+
+            for task,(selected,length) in zip(tasks,results):
+                collect=collect.union([allnodes[i] for i in selected])
+                effective[allnodes[task[0]]]=int(length)
+            K=collect    #for iteration purpose.
+    finally:
+        if threads is not None:
+            _set_blas_threads(threads)
+        if tmpdir is not None:
+            shutil.rmtree(tmpdir,ignore_errors=True)
     subg=nx.subgraph(G,collect)        
+    subg.graph=dict(subg.graph)    #the subgraph shares G.graph
+    subg.graph['effective_L']=effective
+    subg.graph['backend']=backend
     return subg
 
 
-def limkSearch(K, G ,L=3 ,iteration=1):
+def _limk_noi(Pm,xi,kidx,cidx,L,sparse_edges=False,lattices=None,logscale=False,eps=None):
+    '''
+    limkWalks for one node of interest, Pm position xi, with the other seeds
+    kidx and the candidate nodes cidx. lattices is (Lalpha_part1,Lbeta) if
+    they are computed already, followed by (ascale,bscale) if log-scaled.
+    Return (positions,length), the Pm positions of the selected nodes and
+    the walk length used, less than L if stopped early by eps.
+    '''
+    qidx=np.concatenate(([xi],cidx))    ##the first element in qidx would be NOI
+                                        #qidx represents the transient states
+    Qx,Rx=_absorbing_parts(Pm,qidx,np.asarray(kidx,dtype=np.int64))    #the first row is NOI, then the candidate genes
+
+    ##build two lattices, Lalpha and Lbeta
+    if lattices is None:
+        lattices=noi_lattices(Qx,Rx,L,logscale,eps)
+        lattices=lattices[:1]+lattices[2:]    #Lalpha_part2 is not used
+    Lalpha_part1,Lbeta=lattices[:2]
+    scales=lattices[2:] or None
+    
+    ################################################################################
+    ##calculate the expected passage times for each edge.
+    #actually, we don't have to calculate all the edges
+
+    if sparse_edges:
+        edgeM=edge_passage_sparse(Lalpha_part1,Qx,Lbeta,scales=scales)
+    else:
+        edgeM=edge_passage(Lalpha_part1,Qx,Lbeta,scales)    ###expected passage times for edges between transient states
+        #edgeM=edge_passage_ref(Lalpha_part1,Qx,Lbeta)    #the loop version, for confirmation purpose
+
+    ##automatic edge weight threshold selection
+    #maximal theta to induce a connected subgraph from edges
+    if sparse_edges:
+        erow,ecol,evals=edgeM.row,edgeM.col,edgeM.data
+    else:
+        erow,ecol=np.nonzero(edgeM)
+        evals=edgeM[erow,ecol]
+    theta,tmpnodes=select_theta(erow,ecol,evals,edgeM.shape[0])
+    #theta,tmpnodes=select_theta_ref(edgeM)    #for confirmation purpose
+
+    return (qidx[sorted(tmpnodes)],Lalpha_part1.shape[1])
+
+
+def _limk_noi_ooc(Pm,dgr,xi,kidx,L,tmpdir,memory=1<<28,logscale=False,eps=None):
+    '''
+    limkWalks for one node of interest out of core, Pm position xi, with the
+    other seeds kidx. Return (positions,length) as _limk_noi().
+    The lattices are (L,n) memory-mapped arrays in tmpdir over all nodes, the
+    other seeds are masked out after each step instead of slicing Qx and Rx.
+    Pm^T is not built, as A is symmetric, Pm^T.v=D.Pm.(v/D), dgr is D.
+    The edge passage times are computed on the edges between transient
+    states only, for blocks of Pm rows whose lattice entries take about
+    memory bytes.
+    '''
+    n=Pm.shape[0]
+    dtype=Pm.dtype
+    mask=np.ones(n,dtype=dtype)    #transient states
+    mask[kidx]=0
+    alpha=np.lib.format.open_memmap(os.path.join(tmpdir,'alpha.npy'),'w+',dtype,(L,n))
+    beta=np.lib.format.open_memmap(os.path.join(tmpdir,'beta.npy'),'w+',dtype,(L,n))
+    ascale=np.zeros(L)
+    bscale=np.zeros(L)
+
+    vec=np.zeros(n,dtype=dtype)
+    vec[xi]=1
+    alpha[0]=vec
+    for l in range(1,L):
+        vec=dgr*Pm.dot(vec/dgr)
+        vec*=mask
+        if logscale:
+            c=_col_scale(vec)
+            vec/=c
+            ascale[l]=ascale[l-1]+np.log(c)
+        alpha[l]=vec
+        if eps is not None and _absorbed(vec.sum(),eps,ascale[l]):
+            L=l+1
+            break
+
+    beta[0]=0
+    vec=np.zeros(n,dtype=dtype)
+    vec[kidx]=1
+    for l in range(1,L):
+        vec=Pm.dot(vec)
+        vec*=mask
+        if logscale:
+            c=_col_scale(vec)
+            vec/=c
+            bscale[l]=bscale[l-1]+np.log(c)
+        beta[l]=vec
+    alpha.flush()
+    beta.flush()
+
+    B=beta[L-1,xi]
+    if B==0:
+        return (np.zeros(0,dtype=np.int64),L)
+    w=None
+    if logscale:
+        w=_scale_weights((ascale[:L],bscale[:L]))[:,np.newaxis]
+        B=1
+    step=max(1,memory//(2*L*alpha.itemsize))    #edges per block
+    indptr=Pm.indptr
+    erow=[]
+    ecol=[]
+    evals=[]
+    start=0
+    while start < n:
+        stop=int(np.searchsorted(indptr,indptr[start]+step,'right'))-1
+        stop=min(n,max(stop,start+1))
+        lo,hi=indptr[start],indptr[stop]
+        row=np.repeat(np.arange(start,stop),np.diff(indptr[start:stop+1]))
+        col=np.asarray(Pm.indices[lo:hi])
+        keep=(mask[row]>0)&(mask[col]>0)
+        row=row[keep]
+        col=col[keep]
+        a=alpha[:L,row]
+        if w is not None:
+            a*=w
+        val=np.einsum('ij,ij->j',a,beta[:L,col])
+        val*=Pm.data[lo:hi][keep]
+        val/=B
+        erow.append(row)
+        ecol.append(col)
+        evals.append(val)
+        start=stop
+    del alpha,beta
+    theta,tmpnodes=select_theta(np.concatenate(erow),np.concatenate(ecol),np.concatenate(evals),n)
+    return (np.array(sorted(tmpnodes),dtype=np.int64),L)
+
+
+def _limk_task(task):
+    xi,kidx,L,sparse_edges,logscale,eps=task
+    return _limk_noi(_shared['Pm'],xi,kidx,_shared['cidx'],L,sparse_edges,None,logscale,eps)
+
+
+def limkSearch(K, G ,L=3 ,iteration=1, sparse_edges=False, batch=False, processes=1,
+               precision='float64', workdir=None, memory=1<<28, eps=None, backend='auto'):
     '''
     Find subnetwork from a set of terminals using limited k-walk algorithm.
     K: terminals
     G: the edge weighted network
+    sparse_edges,batch,precision,workdir,memory,eps,backend: see limkWalks(),
+    the effective walk lengths of all components are in
+    subG.graph['effective_L'], and the backends used, comma separated, in
+    subG.graph['backend'].
+    processes: number of worker processes, None for all cores. If not 1, the
+    components with terminals are handed to a process pool, largest first.
     '''
-    subG=nx.Graph()
+    if processes is None:
+        processes=multiprocessing.cpu_count()
+    tasks=[]
     for gG in nx.components.connected_component_subgraphs(G):
         local_terminals=set(K) & set(gG.nodes())
         if len(local_terminals) >= 2:
-            subgraph=limkWalks(local_terminals,gG,L,iteration)
-            subG=nx.compose(subG,subgraph)
+            tasks.append((local_terminals,gG,L,iteration,sparse_edges,batch,precision,workdir,memory,eps,backend,1))
+    tasks.sort(key=lambda task: task[1].order(),reverse=True)
+
+    collect=set()
+    effective={}
+    backends=set()
+    if processes > 1 and len(tasks) > 1:
+        workers=min(processes,len(tasks))
+        pool=multiprocessing.Pool(workers,_init_cores,(workers,))    #shares the cores for 'blas'
+        try:
+            for nodes,lengths,used in pool.imap_unordered(_limk_component,tasks,1):
+                collect.update(nodes)
+                effective.update(lengths)
+                backends.add(used)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for task in tasks:
+            nodes,lengths,used=_limk_component(task[:-1]+(processes,))    #workers for the seeds instead
+            collect.update(nodes)
+            effective.update(lengths)
+            backends.add(used)
+    subG=nx.subgraph(G,collect)
+    if not isinstance(subG,nx.Graph):    #gr_io.CSRGraph, return a mutable graph as before
+        subG=subG.copy()
+    subG.graph=dict(subG.graph)
+    subG.graph['effective_L']=effective
+    subG.graph['backend']=','.join(sorted(backends))
     return subG
 
 
+def _limk_component(task):
+    '''
+    Run limkWalks on one connected component, return the selected node set,
+    the effective walk lengths and the backend used.
+    '''
+    local_terminals,gG,L,iteration,sparse_edges,batch,precision,workdir,memory,eps,backend,processes=task
+    subg=limkWalks(local_terminals,gG,L,iteration,sparse_edges,batch,processes,precision,
+                   workdir,memory,eps,backend)
+    return (set(subg.nodes()),subg.graph['effective_L'],subg.graph['backend'])
+
+
 def get_k_neighbor(G, L, node):
     seed = []
     pre_node =  nx.predecessor(G, node, None, L)
@@ -283,7 +1137,16 @@ def get_k_neighbor(G, L, node):
 
     return seed
 
-def get_k_neighbor_term(G, term, L):
+def get_k_neighbor_term(G, term, L, ball=False):
+    '''
+    Return the nodes around the terminals term.
+    By default these are the predecessors of the nodes reached in L hops
+    from each terminal, i.e. nodes within L-1 hops that lead one hop further.
+    If ball is True, all nodes within L hops of any terminal are returned,
+    found by a single search, see k_hop_ball().
+    '''
+    if ball:
+        return set(k_hop_ball(G, term, L)[0])
     seed = []
     for item in term:
         pre_node = get_k_neighbor(G, L, item)
@@ -291,6 +1154,61 @@ def get_k_neighbor_term(G, term, L):
 
     return set(seed)
 
+def k_hop_ball(G, sources, L):
+    '''
+    Multi-source breadth first search limited to L hops.
+    Return (nodes, dist), nodes within L hops of any source in BFS order, and
+    an integer array of their hop distances to the nearest source.
+    Sources not in G are ignored.
+    For a gr_io.CSRGraph, a whole level is expanded at a time with array
+    operations on the CSR adjacency, otherwise the adjacency dicts are walked.
+    Both visit only the edges of the ball, plus an O(n) distance array for
+    the CSRGraph.
+    '''
+    if hasattr(G, 'indptr'):
+        index = G.index
+        dist = np.empty(len(G.labels), dtype=np.int32)
+        dist.fill(-1)
+        frontier = np.unique(np.array([index[x] for x in sources if x in index], dtype=np.int64))
+        dist[frontier] = 0
+        levels = [frontier]
+        for d in range(1, L+1):
+            starts = G.indptr[frontier]
+            counts = G.indptr[frontier+1] - starts
+            total = counts.sum()
+            if total == 0:
+                break
+            #positions of the neighbors of all frontier nodes in G.indices
+            offsets = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(total)
+            nbrs = G.indices[offsets]
+            frontier = np.unique(nbrs[dist[nbrs] < 0]).astype(np.int64)
+            if len(frontier) == 0:
+                break
+            dist[frontier] = d
+            levels.append(frontier)
+        ball = np.concatenate(levels)
+        return ([G.labels[i] for i in ball], dist[ball])
+
+    dist = {}
+    frontier = []
+    for x in sources:
+        if x in G and x not in dist:
+            dist[x] = 0
+            frontier.append(x)
+    nodes = list(frontier)
+    for d in range(1, L+1):
+        nextlevel = []
+        for u in frontier:
+            for w in G[u]:
+                if w not in dist:
+                    dist[w] = d
+                    nextlevel.append(w)
+        if not nextlevel:
+            break
+        nodes += nextlevel
+        frontier = nextlevel
+    return (nodes, np.array([dist[x] for x in nodes], dtype=np.int32))
+
 if __name__=='__main__':
     print 'Now testing limited k-walk algorithm now...'
     from gr_io import *
@@ -7,7 +7,7 @@ import time
 
 class SearchBaseExpansion(object):
 	"""docstring for ClassName"""
-	def __init__(self, cut_off, fname):
+	def __init__(self, cut_off, fname, store=None):
 		file = open('{0}.json'.format(fname), 'r')
 		self.fname = fname
 		self.clustering = json.load(file)
@@ -16,10 +16,14 @@ class SearchBaseExpansion(object):
 		self.result = []
 		self.paths = []
 		self.cut_off= cut_off
+		self.pathways = None
+		self.store = store
 		file.close()
 
 	def update_terminal(self, fname):
-		return read_terminals('../pathway2/{0}.txt'.format(fname))
+		if self.pathways is None:
+			self.pathways = read_terminal_corpus('../pathway2', packed='../pathway2.npz')
+		return self.pathways[fname]
 
 	def mul(self, x, y):
 		return x*y 
@@ -63,15 +67,19 @@ class SearchBaseExpansion(object):
 			self.result.extend(self.bfs(gene)[0])
 			self.paths.extend(self.bfs(gene)[1])
 
-		node = open('./result/node/{0}.txt'.format(fname), 'w')
-		for item in set(self.result):
-			node.write('{0}\n'.format(item))
-		node.close()
+		if self.store is not None:
+			self.store.put_nodes(fname, 'node', set(self.result))
+			self.store.put_lines(fname, 'expanedge', [str(item) for item in self.paths])
+		else:
+			node = open('./result/node/{0}.txt'.format(fname), 'w')
+			for item in set(self.result):
+				node.write('{0}\n'.format(item))
+			node.close()
 
-		edge = open('./result/expanedge/{0}.txt'.format(fname), 'w')
-		for item in self.paths:
-			edge.write(str(item)+'\n')
-		edge.close()
+			edge = open('./result/expanedge/{0}.txt'.format(fname), 'w')
+			for item in self.paths:
+				edge.write(str(item)+'\n')
+			edge.close()
 		end = time.time()
 		print 'time:{0}'.format(end - start)
 
@@ -91,7 +99,7 @@ class SearchBaseExpansion(object):
 		pass
 
 if __name__ == '__main__':
-	algorithms = SearchBaseExpansion(0.7, 'Tumor_Net_Basic_p.net')
+	algorithms = SearchBaseExpansion(0.7, 'Tumor_Net_Basic_p.net', ResultStore('./result/search.db'))
 	'''
 	f = open('{0}.json'.format(algorithms.fname), 'w')
 	f.write(json.dumps(nx.clustering(algorithms.G)))
@@ -101,4 +109,6 @@ if __name__ == '__main__':
 	
 	for i in range(1, 299):
 		algorithms.run(str(i))
+	#algorithms.store.export('./result')    #the per-file layout
+	algorithms.store.close()
 